@@ -0,0 +1,71 @@
+"""
+بنچمارک تقسیم خودکار اتاق‌های جانبی
+Breakout Assignment Benchmark
+
+Assigns a large class to breakout rooms with keep-apart and keep-together
+pairs, quiz scores and earlier groupings, then checks balance and
+constraints.
+
+Run from the repository root:
+    python benchmarks/bench_breakout_assign.py --participants 2000 --rooms 200
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import breakout_assign
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--participants", type=int, default=2000)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--apart-pairs", type=int, default=300)
+    parser.add_argument("--together-pairs", type=int, default=100)
+    parser.add_argument("--history-sessions", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    people = [f"student{i}" for i in range(args.participants)]
+    scores = {p: rng.random() for p in people}
+    keep_apart = [rng.sample(people, 2) for _ in range(args.apart_pairs)]
+    keep_together = [rng.sample(people, 2) for _ in range(args.together_pairs)]
+    history = []
+    for session in range(args.history_sessions):
+        history.extend(breakout_assign.assign(people, args.rooms, seed=100 + session))
+
+    timings = []
+    for run in range(args.repeat):
+        start = time.perf_counter()
+        groups = breakout_assign.assign(
+            people, args.rooms,
+            keep_apart=keep_apart, keep_together=keep_together,
+            scores=scores, history=history, seed=run,
+        )
+        timings.append(time.perf_counter() - start)
+
+    sizes = [len(g) for g in groups]
+    room_means = [statistics.mean(scores[p] for p in g) for g in groups if g]
+    violations = breakout_assign.count_violations(groups, keep_apart, keep_together, history)
+    baseline = breakout_assign.count_violations(
+        breakout_assign.assign(people, args.rooms, seed=999), keep_apart, keep_together, history)
+    assigned = sorted(p for g in groups for p in g)
+
+    print(f"participants/rooms:    {args.participants} / {args.rooms}")
+    print(f"assign time:           best {min(timings) * 1000:.0f} ms, median {statistics.median(timings) * 1000:.0f} ms")
+    print(f"room sizes:            min {min(sizes)}, max {max(sizes)}")
+    print(f"room mean score:       {min(room_means):.3f} .. {max(room_means):.3f}")
+    print(f"violations:            {violations}")
+    print(f"unconstrained repeats: {baseline['repeats']}")
+    if assigned != sorted(people):
+        print("error: participants lost or duplicated")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
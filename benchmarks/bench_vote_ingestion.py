@@ -0,0 +1,95 @@
+"""
+بنچمارک ثبت همزمان آرا
+Vote Ingestion Benchmark
+
+Simulates a quiz burst: many students vote at once (threads and separate
+processes), some of them change their answer, and the aggregator folds the
+log into polls.json. Verifies that no vote is lost and that the counters
+match the responses.
+
+Run from the repository root:
+    python benchmarks/bench_vote_ingestion.py --voters 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import poll_tally
+from modules import vote_log
+
+ROOM_ID = "room_bench"
+POLL_ID = "poll_bench"
+NUM_OPTIONS = 4
+
+def cast_vote(args):
+    """One student voting: log append plus a non-blocking aggregation attempt"""
+    username, option, polls_file = args
+    vote_log.append_vote(ROOM_ID, POLL_ID, username, [option])
+    vote_log.aggregate(ROOM_ID, polls_file, blocking=False)
+    return username, option
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--voters", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--revote-fraction", type=float, default=0.2)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="vote_bench_"))
+    polls_file = Path("data/polls.json")
+    polls_file.parent.mkdir(parents=True)
+    poll = {
+        'id': POLL_ID,
+        'question': 'bench',
+        'options': [f"option {i}" for i in range(NUM_OPTIONS)],
+        'allow_multiple': False,
+        'responses': {},
+        'counts': [0] * NUM_OPTIONS,
+        'version': 0,
+        'status': 'active',
+    }
+    polls_file.write_text(json.dumps({ROOM_ID: [poll]}))
+
+    rng = random.Random(42)
+    first_round = [(f"student{i}", rng.randrange(NUM_OPTIONS), polls_file) for i in range(args.voters)]
+    revoters = rng.sample(range(args.voters), int(args.voters * args.revote_fraction))
+    second_round = [(f"student{i}", rng.randrange(NUM_OPTIONS), polls_file) for i in revoters]
+
+    expected = {username: option for username, option, _ in first_round}
+    expected.update({username: option for username, option, _ in second_round})
+
+    start = time.perf_counter()
+    half = len(first_round) // 2
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        list(pool.map(cast_vote, first_round[:half], chunksize=16))
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(cast_vote, first_round[half:]))
+        list(pool.map(cast_vote, second_round))
+    vote_log.aggregate(ROOM_ID, polls_file)
+    elapsed = time.perf_counter() - start
+
+    stored = json.loads(polls_file.read_text())[ROOM_ID][0]
+    lost = [u for u, option in expected.items() if stored['responses'].get(u) != option]
+    recount_ok = poll_tally.compute_counts(stored) == stored['counts']
+    total_votes = len(first_round) + len(second_round)
+
+    print(f"votes cast:        {total_votes} ({len(second_round)} changed answers)")
+    print(f"elapsed:           {elapsed:.2f} s ({total_votes / elapsed:.0f} votes/s)")
+    print(f"responses stored:  {len(stored['responses'])} / {len(expected)}")
+    print(f"lost or stale:     {len(lost)}")
+    print(f"counters match:    {recount_ok} {stored['counts']}")
+    if lost or not recount_ok or len(stored['responses']) != len(expected):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
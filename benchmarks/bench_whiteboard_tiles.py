@@ -0,0 +1,94 @@
+"""
+بنچمارک کاشی‌بندی تخته سفید
+Whiteboard Tile Encoding Benchmark
+
+Draws short strokes on a canvas one at a time and publishes each frame
+twice: as a full PNG (the previous img.save path) and as dirty tiles only.
+Reports encode time and bytes written per stroke and checks that the
+composed image matches the last frame.
+
+Run from the repository root:
+    python benchmarks/bench_whiteboard_tiles.py --width 1200 --height 500 --strokes 200
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import whiteboard_tiles
+
+def draw_stroke(frame, rng, length=40, width=3):
+    """Draw a short random polyline segment in place"""
+    height, canvas_width = frame.shape[:2]
+    y = rng.randrange(height)
+    x = rng.randrange(canvas_width)
+    dy, dx = rng.choice([(0, 1), (1, 0), (1, 1), (1, -1)])
+    color = [rng.randrange(256) for _ in range(3)] + [255]
+    for step in range(length):
+        cy, cx = y + dy * step, x + dx * step
+        frame[max(cy - width, 0):cy + width, max(cx - width, 0):cx + width] = color
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--width", type=int, default=1200)
+    parser.add_argument("--height", type=int, default=500)
+    parser.add_argument("--strokes", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    frame = np.full((args.height, args.width, 4), 255, dtype=np.uint8)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        full_path = Path(tmp) / "board_canvas.png"
+        tiles = whiteboard_tiles.tile_dir(full_path)
+        # Initial publish writes every tile; it is not part of the comparison
+        whiteboard_tiles.write_tiles(tiles, frame.copy())
+
+        full_times, full_bytes = [], []
+        tile_times, tile_bytes, tile_counts = [], [], []
+        for _ in range(args.strokes):
+            draw_stroke(frame, rng)
+            snapshot = frame.copy()
+
+            start = time.perf_counter()
+            Image.fromarray(snapshot).save(full_path)
+            full_times.append(time.perf_counter() - start)
+            full_bytes.append(full_path.stat().st_size)
+
+            start = time.perf_counter()
+            written = whiteboard_tiles.write_tiles(tiles, snapshot)
+            tile_times.append(time.perf_counter() - start)
+            tile_counts.append(written)
+            manifest = whiteboard_tiles.load_manifest(tiles)
+            tile_bytes.append(sum((tiles / f"{name}.png").stat().st_size
+                                  for name, version in manifest['tiles'].items()
+                                  if version == manifest['version']))
+
+        start = time.perf_counter()
+        composed = np.asarray(whiteboard_tiles.composite(tiles))
+        compose_time = time.perf_counter() - start
+        matches = np.array_equal(composed, frame)
+
+    grid = whiteboard_tiles.grid_shape(args.height, args.width)
+    print(f"canvas:               {args.width}x{args.height}, {grid[0] * grid[1]} tiles of {whiteboard_tiles.TILE_SIZE}px")
+    print(f"full PNG per stroke:  median {statistics.median(full_times) * 1000:.2f} ms, "
+          f"{statistics.mean(full_bytes) / 1024:.1f} KB")
+    print(f"dirty tiles/stroke:   median {statistics.median(tile_times) * 1000:.2f} ms, "
+          f"{statistics.mean(tile_bytes) / 1024:.1f} KB, {statistics.mean(tile_counts):.1f} tiles")
+    print(f"speedup:              {statistics.median(full_times) / statistics.median(tile_times):.1f}x")
+    print(f"compose on demand:    {compose_time * 1000:.1f} ms")
+    if not matches:
+        print("error: composed image differs from the last frame")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
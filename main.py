@@ -22,6 +22,7 @@ from modules import poll
 from modules import breakout_rooms
 from modules import recording
 from modules import ui
+from modules import presence
 
 # Page configuration
 st.set_page_config(
@@ -47,8 +48,8 @@ if 'room_id' not in st.session_state:
 
 def main():
     """Main application function"""
-    # Authentication
-    if not st.session_state.authenticated:
+    # Authentication (a valid signed token restores the session after a reconnect)
+    if not st.session_state.authenticated and not auth.restore_session():
         auth.show_login()
         return
 
@@ -70,9 +71,22 @@ def main():
 
     selected, did_logout = ui.render_sidebar(st.session_state.username, st.session_state.user_role, menu_options)
     if did_logout:
+        presence.leave(st.session_state.room_id, st.session_state.username)
         auth.logout()
         st.rerun()
 
+    # Keep the user's live presence in the active class up to date
+    if st.session_state.room_id:
+        presence.render_heartbeat(st.session_state.room_id, st.session_state.username)
+
+        # Chat, whiteboard and files follow the user into a breakout room
+        active_room = classroom.active_room_id()
+        if active_room != st.session_state.room_id:
+            st.sidebar.info(f"🚪 اتاق جانبی: {active_room}")
+            if st.sidebar.button("بازگشت به کلاس اصلی", key="leave_subroom"):
+                classroom.leave_subroom()
+                st.rerun()
+
     # Main content area
     if selected == "کلاس درس":
         classroom.show()
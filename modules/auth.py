@@ -5,12 +5,24 @@ Authentication Module
 
 import streamlit as st
 import hashlib
+import hmac
+import base64
 import json
+import os
+import secrets
+import time
 from pathlib import Path
 
 # User database file
 USERS_FILE = Path("data/users.json")
 
+# Signed session tokens (restore a session after reconnect without the user store)
+SESSION_SECRET_FILE = Path("data/session_secret.key")
+SESSION_TOKEN_TTL = 12 * 60 * 60  # seconds
+SESSION_QUERY_PARAM = "session"
+
+_session_secret = None
+
 def init_users_db():
     """Initialize users database"""
     USERS_FILE.parent.mkdir(exist_ok=True)
@@ -61,6 +73,114 @@ def verify_credentials(username, password):
             return True, users[username]
     return False, None
 
+def _get_session_secret():
+    """Return the HMAC key, loaded once per process"""
+    global _session_secret
+    if _session_secret is None:
+        env_secret = os.environ.get("SESSION_SECRET")
+        if env_secret:
+            _session_secret = env_secret.encode()
+        else:
+            _session_secret = _load_secret_file(SESSION_SECRET_FILE)
+    return _session_secret
+
+def _load_secret_file(path, size=32):
+    """Read the key file, creating it owner-only (0600) if it does not exist.
+
+    If another process creates it first, its key is read back instead; an
+    existing key file that others can read is tightened to 0600.
+    """
+    path.parent.mkdir(exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        if os.stat(path).st_mode & 0o077:
+            os.chmod(path, 0o600)
+        # The creator may still be writing; wait briefly for the full key
+        for _ in range(50):
+            key = path.read_bytes()
+            if len(key) >= size:
+                return key
+            time.sleep(0.02)
+        raise RuntimeError(f"session secret file {path} is incomplete")
+    key = secrets.token_bytes(size)
+    try:
+        os.write(fd, key)
+    finally:
+        os.close(fd)
+    return key
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def sign_message(message):
+    """URL-safe HMAC signature of a string with the session secret"""
+    return _b64encode(hmac.new(_get_session_secret(), message.encode("utf-8"), hashlib.sha256).digest())
+
+def verify_message(message, signature):
+    """Check a signature produced by sign_message"""
+    return hmac.compare_digest(sign_message(message), signature or "")
+
+def issue_session_token(username, role, full_name, room_id=None, ttl=SESSION_TOKEN_TTL):
+    """Create an HMAC-signed, expiring token carrying the session identity"""
+    payload = {
+        "u": username,
+        "r": role,
+        "n": full_name,
+        "room": room_id,
+        "exp": int(time.time()) + ttl,
+    }
+    body = _b64encode(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    signature = hmac.new(_get_session_secret(), body.encode("ascii"), hashlib.sha256).digest()
+    return f"{body}.{_b64encode(signature)}"
+
+def verify_session_token(token):
+    """Return the token payload if the signature is valid and not expired, else None"""
+    if not token or token.count(".") != 1:
+        return None
+    body, signature = token.split(".")
+    try:
+        expected = hmac.new(_get_session_secret(), body.encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        payload = json.loads(_b64decode(body).decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if payload.get("exp", 0) < time.time():
+        return None
+    return payload
+
+def persist_session():
+    """Store a fresh session token for the current session in the query string"""
+    if not st.session_state.get("authenticated"):
+        return
+    token = issue_session_token(
+        st.session_state.username,
+        st.session_state.user_role,
+        st.session_state.get("full_name"),
+        st.session_state.get("room_id"),
+    )
+    st.query_params[SESSION_QUERY_PARAM] = token
+
+def restore_session():
+    """Restore the session from a signed token after a reconnect or refresh.
+
+    Only the token is checked; the user store is not read and no password is
+    hashed, so a reconnect costs one HMAC verification.
+    """
+    payload = verify_session_token(st.query_params.get(SESSION_QUERY_PARAM))
+    if payload is None:
+        return False
+    st.session_state.authenticated = True
+    st.session_state.username = payload["u"]
+    st.session_state.user_role = payload["r"]
+    st.session_state.full_name = payload.get("n")
+    st.session_state.room_id = payload.get("room")
+    return True
+
 def show_login():
     """Show login interface"""
     st.title("🎓 پلتفرم آموزش آنلاین")
@@ -82,6 +202,7 @@ def show_login():
                         st.session_state.username = username
                         st.session_state.user_role = user_data["role"]
                         st.session_state.full_name = user_data["full_name"]
+                        persist_session()
                         st.success("ورود موفق!")
                         st.rerun()
                     else:
@@ -118,3 +239,6 @@ def logout():
     st.session_state.username = None
     st.session_state.user_role = None
     st.session_state.full_name = None
+    st.session_state.room_id = None
+    if SESSION_QUERY_PARAM in st.query_params:
+        del st.query_params[SESSION_QUERY_PARAM]
@@ -0,0 +1,58 @@
+"""
+ماژول کارهای پس‌زمینه
+Background Work Module
+"""
+
+import threading
+
+class KeyedWorker:
+    """Runs ``func(key)`` for requested keys on one daemon thread.
+
+    A key that is already queued is not queued again, so repeated requests
+    from many reruns cost one run. A failed run is counted in ``errors``,
+    its key and exception kept in ``last_error``, and the key can be
+    requested again.
+    """
+
+    def __init__(self, func, name):
+        self._func = func
+        self._name = name
+        self._queue = []
+        self._queued = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.completed = 0
+        self.errors = 0
+        self.last_error = None
+
+    def request(self, key):
+        with self._cond:
+            if key in self._queued:
+                return
+            self._queued.add(key)
+            self._queue.append(key)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def flush(self, timeout=None):
+        """Wait until every requested key has been processed"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queued, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                key = self._queue.pop(0)
+            try:
+                self._func(key)
+                self.completed += 1
+            except Exception as exc:
+                self.errors += 1
+                self.last_error = (key, repr(exc))
+            finally:
+                with self._cond:
+                    self._queued.discard(key)
+                    self._cond.notify_all()
@@ -0,0 +1,143 @@
+"""
+ماژول تقسیم خودکار شرکت‌کنندگان به اتاق‌های جانبی
+Breakout Assignment Engine
+"""
+
+import heapq
+import random
+from collections import Counter
+
+def balanced_sizes(num_participants, num_rooms):
+    """Room sizes that differ by at most one"""
+    base, extra = divmod(num_participants, num_rooms)
+    return [base + (1 if i < extra else 0) for i in range(num_rooms)]
+
+def _units(participants, keep_together):
+    """Group participants that must share a room (union-find)"""
+    parent = {p: p for p in participants}
+
+    def find(p):
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    for group in keep_together:
+        members = [p for p in group if p in parent]
+        for other in members[1:]:
+            parent[find(other)] = find(members[0])
+
+    units = {}
+    for p in participants:
+        units.setdefault(find(p), []).append(p)
+    return list(units.values())
+
+def _neighbours(pairs, participants):
+    neighbours = {p: set() for p in participants}
+    for group in pairs:
+        members = [p for p in group if p in neighbours]
+        for p in members:
+            neighbours[p].update(m for m in members if m != p)
+    return neighbours
+
+def assign(participants, num_rooms, keep_apart=(), keep_together=(), scores=None, history=(), seed=None):
+    """Split participants into balanced breakout groups.
+
+    Room sizes differ by at most one unless keep-together groups make that
+    impossible. ``keep_apart`` and ``keep_together`` are iterables of
+    username groups; ``scores`` maps usernames to prior quiz scores so each
+    room gets a similar mix; ``history`` is a list of earlier groups whose
+    pairings should not repeat. Keep-apart is treated as a hard constraint
+    whenever a room without a conflict has space; repeats are avoided
+    where possible.
+
+    Returns a list of ``num_rooms`` lists (fewer if there are not enough
+    participants to fill every room).
+    """
+    participants = list(dict.fromkeys(participants))
+    num_rooms = max(1, min(num_rooms, len(participants)))
+    if not participants:
+        return []
+
+    rng = random.Random(seed)
+    scores = scores or {}
+    apart = _neighbours(keep_apart, participants)
+    seen = _neighbours(history, participants)
+
+    units = _units(participants, keep_together)
+    rng.shuffle(units)
+    # Big units first so they still fit; then strongest first so rooms are
+    # filled like a snake draft when mixing by score
+    units.sort(key=lambda u: (-len(u), -sum(scores.get(p, 0) for p in u)))
+
+    remaining = balanced_sizes(len(participants), num_rooms)
+    score_sum = [0.0] * num_rooms
+    version = [0] * num_rooms
+    groups = [[] for _ in range(num_rooms)]
+    room_of = {}
+
+    # Min-heap over rooms: lowest score total, then most free seats
+    heap = [(0.0, -remaining[r], r, 0) for r in range(num_rooms)]
+    heapq.heapify(heap)
+
+    def place(unit, room):
+        groups[room].extend(unit)
+        for p in unit:
+            room_of[p] = room
+        remaining[room] -= len(unit)
+        score_sum[room] += sum(scores.get(p, 0) for p in unit)
+        version[room] += 1
+        heapq.heappush(heap, (score_sum[room], -remaining[room], room, version[room]))
+
+    for unit in units:
+        apart_hits = Counter(room_of[v] for p in unit for v in apart[p] if v in room_of)
+        repeat_hits = Counter(room_of[v] for p in unit for v in seen[p] if v in room_of)
+
+        chosen = None
+        skipped = []
+        while heap:
+            entry = heapq.heappop(heap)
+            room = entry[2]
+            if entry[3] != version[room]:
+                continue  # stale
+            skipped.append(entry)
+            if remaining[room] >= len(unit) and room not in apart_hits and room not in repeat_hits:
+                chosen = room
+                skipped.pop()
+                break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+
+        if chosen is None:
+            # No conflict-free room has space: take the least bad one
+            chosen = min(
+                range(num_rooms),
+                key=lambda r: (
+                    remaining[r] < len(unit),
+                    apart_hits.get(r, 0),
+                    repeat_hits.get(r, 0),
+                    score_sum[r],
+                    -remaining[r],
+                ),
+            )
+            version[chosen] += 1  # drop its heap entry; place() pushes a fresh one
+        place(unit, chosen)
+
+    return groups
+
+def count_violations(groups, keep_apart=(), keep_together=(), history=()):
+    """Count broken keep-apart/keep-together constraints and repeated pairs"""
+    room_of = {p: idx for idx, group in enumerate(groups) for p in group}
+
+    def pairs(group_list):
+        for group in group_list:
+            members = [p for p in group if p in room_of]
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    yield a, b
+
+    return {
+        'keep_apart': sum(room_of[a] == room_of[b] for a, b in pairs(keep_apart)),
+        'keep_together': sum(room_of[a] != room_of[b] for a, b in pairs(keep_together)),
+        'repeats': sum(room_of[a] == room_of[b] for a, b in pairs(history)),
+    }
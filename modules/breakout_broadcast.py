@@ -0,0 +1,71 @@
+"""
+ماژول پیام همگانی اتاق‌های جانبی
+Breakout Broadcast Module
+
+A teacher's message is appended once to the class's broadcast log together
+with the set of breakout rooms it is meant for, however many rooms that is.
+Students keep a byte offset into the log and only read what was appended
+since their last fetch.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+from modules import storage
+
+BROADCAST_DIR = Path("data/breakout_broadcasts")
+
+# Recipient marker for messages sent to every breakout room of the class
+ALL_ROOMS = "*"
+
+def _log_path(room_id):
+    return BROADCAST_DIR / f"{room_id}.jsonl"
+
+def send_broadcast(room_id, sender, message, recipients=ALL_ROOMS, ts=None):
+    """Append a broadcast for the given breakout room ids in a single write.
+
+    ``recipients`` is a list of breakout room ids or ``ALL_ROOMS``.
+    """
+    entry = {
+        'sender': sender,
+        'message': message,
+        'recipients': recipients if recipients == ALL_ROOMS else sorted(set(recipients)),
+        'ts': time.time() if ts is None else ts,
+    }
+    line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode('utf-8')
+    path = _log_path(room_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+    return entry
+
+def is_recipient(entry, breakout_id):
+    """True if a broadcast entry is addressed to the breakout room"""
+    recipients = entry.get('recipients', ALL_ROOMS)
+    return recipients == ALL_ROOMS or breakout_id in recipients
+
+def fetch_since(room_id, offset=0):
+    """Read broadcasts appended after ``offset``.
+
+    Returns (entries, new_offset). A partially written trailing line is left
+    for the next fetch, and nothing is read when the log has not grown.
+    """
+    version = storage.file_version(_log_path(room_id))
+    if version is None or version[1] <= offset:
+        return [], offset
+    with open(_log_path(room_id), 'rb') as f:
+        f.seek(offset)
+        chunk = f.read()
+    end = chunk.rfind(b"\n") + 1
+    entries = []
+    for line in chunk[:end].splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries, offset + end
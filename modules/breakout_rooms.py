@@ -5,10 +5,31 @@ Breakout Rooms Module
 
 import streamlit as st
 import json
+import threading
+import time
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
+from modules import breakout_broadcast
+from modules import classroom
+from modules import storage
 
 BREAKOUT_FILE = Path("data/breakout_rooms.json")
+# Reverse index: class id -> {username: position of the user's active breakout room}
+BREAKOUT_INDEX_FILE = Path("data/breakout_index.json")
+HISTORY_FILE = Path("data/breakout_history.json")
+
+# Number of earlier breakout sessions remembered to avoid repeat groupings
+HISTORY_SESSIONS = 10
+
+# Seconds between checks for new teacher broadcasts in the student view
+BROADCAST_POLL_INTERVAL = 5
+
+# Serializes writers of the breakout file, including recall timer threads
+_breakout_lock = threading.RLock()
+
+# (class id, set id) -> pending recall timer
+_recall_timers = {}
+_recall_lock = threading.Lock()
 
 def init_breakout_db():
     """Initialize breakout rooms database"""
@@ -27,13 +48,185 @@ def load_breakout_rooms(room_id):
 def save_breakout_rooms(room_id, rooms):
     """Save breakout rooms"""
     init_breakout_db()
-    with open(BREAKOUT_FILE, 'r', encoding='utf-8') as f:
-        all_rooms = json.load(f)
-    
-    all_rooms[room_id] = rooms
+    with _breakout_lock:
+        with open(BREAKOUT_FILE, 'r', encoding='utf-8') as f:
+            all_rooms = json.load(f)
+        
+        all_rooms[room_id] = rooms
+        
+        storage.write_json_atomic(BREAKOUT_FILE, all_rooms)
+        save_breakout_index(room_id, rooms)
+
+def start_breakout_set(room_id, rooms, duration=0):
+    """Save a new set of breakout rooms, optionally recalled after ``duration`` minutes"""
+    now = datetime.now()
+    set_id = f"set_{now.strftime('%Y%m%d%H%M%S')}"
+    deadline = (now + timedelta(minutes=duration)).isoformat() if duration else None
+    for room in rooms:
+        room['set_id'] = set_id
+        room['deadline'] = deadline
+    save_breakout_rooms(room_id, rooms)
+    if deadline:
+        schedule_recall(room_id, set_id, deadline)
+
+def _is_expired(room, now=None):
+    deadline = room.get('deadline')
+    if not deadline:
+        return False
+    return datetime.fromisoformat(deadline).timestamp() <= (time.time() if now is None else now)
+
+def close_breakout_set(room_id, set_id=None):
+    """Close every active room of a set (all sets if None) in a single write.
+
+    Returns the number of rooms closed.
+    """
+    with _breakout_lock:
+        rooms = load_breakout_rooms(room_id)
+        closed = 0
+        for room in rooms:
+            if room['status'] == 'active' and set_id in (None, room.get('set_id')):
+                room['status'] = 'closed'
+                closed += 1
+        if closed:
+            save_breakout_rooms(room_id, rooms)
+    return closed
+
+def _recall(room_id, set_id):
+    close_breakout_set(room_id, set_id)
+    with _recall_lock:
+        _recall_timers.pop((room_id, set_id), None)
+
+def schedule_recall(room_id, set_id, deadline):
+    """Close a breakout set once its ISO ``deadline`` passes (one timer per set)"""
+    key = (room_id, set_id)
+    delay = max(0.0, datetime.fromisoformat(deadline).timestamp() - time.time())
+    with _recall_lock:
+        if key in _recall_timers:
+            return
+        timer = threading.Timer(delay, _recall, args=key)
+        timer.daemon = True
+        _recall_timers[key] = timer
+    timer.start()
+
+def ensure_recall(room_id):
+    """Recall expired sets and schedule pending ones, e.g. after a restart"""
+    rooms = storage.read_json_cached(BREAKOUT_FILE, {}).get(room_id, [])
+    pending = {}
+    for room in rooms:
+        if room['status'] == 'active' and room.get('deadline'):
+            pending[room.get('set_id')] = room
+    for set_id, room in pending.items():
+        if _is_expired(room):
+            close_breakout_set(room_id, set_id)
+        else:
+            schedule_recall(room_id, set_id, room['deadline'])
+
+def build_breakout_index(rooms):
+    """Map each username to the position of their active breakout room"""
+    index = {}
+    for position, room in enumerate(rooms):
+        if room['status'] == 'active':
+            for username in room['participants']:
+                index[username] = position
+    return index
+
+def save_breakout_index(room_id, rooms):
+    """Rewrite the reverse index entry of a class after its rooms change"""
+    all_index = dict(storage.read_json_cached(BREAKOUT_INDEX_FILE, {}))
+    all_index[room_id] = build_breakout_index(rooms)
+    storage.write_json_atomic(BREAKOUT_INDEX_FILE, all_index)
+
+def find_user_breakout(room_id, username):
+    """Return the active breakout room of a user, or None, without scanning rooms"""
+    all_index = storage.read_json_cached(BREAKOUT_INDEX_FILE, {})
+    all_rooms = storage.read_json_cached(BREAKOUT_FILE, {})
+    rooms = all_rooms.get(room_id, [])
+    if room_id in all_index:
+        position = all_index[room_id].get(username)
+    else:
+        # Breakout sets saved before the index existed
+        position = build_breakout_index(rooms).get(username)
+    if position is not None and (position >= len(rooms) or
+                                 rooms[position]['status'] != 'active' or
+                                 username not in rooms[position]['participants']):
+        # Stale index (concurrent save or manual edit): trust the rooms themselves
+        position = build_breakout_index(rooms).get(username)
+    if position is None:
+        return None
+    # A set past its deadline is over even before the recall has been written
+    if _is_expired(rooms[position]):
+        return None
+    return rooms[position]
+
+def load_breakout_history(room_id):
+    """Load earlier breakout groupings of a class (list of username lists)"""
+    if not HISTORY_FILE.exists():
+        return []
+    with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f).get(room_id, [])
+
+def save_breakout_history(room_id, groups):
+    """Remember the groups of a new breakout session"""
+    with _breakout_lock:
+        all_history = {}
+        if HISTORY_FILE.exists():
+            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+                all_history = json.load(f)
+        
+        sessions = all_history.get(room_id, [])
+        sessions.append([g for g in groups if len(g) > 1])
+        all_history[room_id] = sessions[-HISTORY_SESSIONS:]
+        
+        storage.write_json_atomic(HISTORY_FILE, all_history)
+
+def parse_pairs(text):
+    """Parse constraint lines like 'user1، user2' into username groups"""
+    groups = []
+    for line in text.splitlines():
+        members = [m.strip() for m in line.replace('،', ',').split(',') if m.strip()]
+        if len(members) > 1:
+            groups.append(members)
+    return groups
+
+def _participant_scores(room_id):
+    """Overall quiz percentage of each student in this class"""
+    from modules import grading
+    from modules.poll import load_polls
+    quizzes = [p for p in load_polls(room_id) if grading.is_gradable(p)]
+    students, _, _, totals = grading.build_gradebook(quizzes)
+    return dict(zip(students, totals.tolist()))
+
+def show_countdown(breakout_room):
+    """Time left before the breakout set is recalled, from the stored deadline"""
+    from modules.poll_deadlines import format_remaining
+    remaining = datetime.fromisoformat(breakout_room['deadline']).timestamp() - time.time()
+    if remaining > 0:
+        st.warning(f"⏱️ زمان باقی‌مانده تا بازگشت به کلاس: {format_remaining(remaining)}")
+    else:
+        st.info("زمان اتاق‌های جانبی به پایان رسید؛ به کلاس اصلی بازگردید")
+
+def show_broadcasts(room_id, user_room):
+    """Show teacher broadcasts addressed to the student's breakout room.
+
+    Only log bytes appended since the previous run are read; the fetched
+    entries are kept in the session.
+    """
+    inbox = st.session_state.get('breakout_inbox')
+    if not inbox or inbox['room_id'] != room_id:
+        inbox = {'room_id': room_id, 'offset': 0, 'entries': []}
+        st.session_state.breakout_inbox = inbox
+    entries, inbox['offset'] = breakout_broadcast.fetch_since(room_id, inbox['offset'])
+    inbox['entries'].extend(entries)
     
-    with open(BREAKOUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(all_rooms, f, ensure_ascii=False, indent=2)
+    since = datetime.fromisoformat(user_room['created_at']).timestamp()
+    messages = [e for e in inbox['entries']
+                if e['ts'] >= since and breakout_broadcast.is_recipient(e, user_room['id'])]
+    if not messages:
+        st.caption("پیامی از مدرس دریافت نشده است")
+        return
+    for entry in reversed(messages):
+        sent_at = datetime.fromtimestamp(entry['ts']).strftime('%H:%M')
+        st.info(f"📢 {entry['message']}  \n_{sent_at}_")
 
 def show():
     """Show breakout rooms interface"""
@@ -44,6 +237,7 @@ def show():
         return
     
     st.info(f"کلاس فعال: {st.session_state.room_id}")
+    ensure_recall(st.session_state.room_id)
     
     if st.session_state.user_role == "مدرس":
         show_teacher_breakout_view()
@@ -74,6 +268,9 @@ def show_teacher_breakout_view():
         
         st.write(f"تعداد شرکت‌کنندگان: {len(participants)} نفر")
         
+        duration = st.number_input("مدت اتاق‌ها (دقیقه، ۰ = بدون محدودیت):",
+                                   min_value=0, max_value=180, value=0)
+        
         # Automatic or manual assignment
         assignment_method = st.radio(
             "روش تقسیم:",
@@ -81,18 +278,28 @@ def show_teacher_breakout_view():
         )
         
         if assignment_method == "تقسیم خودکار":
-            num_rooms = st.number_input("تعداد اتاق‌ها:", min_value=2, max_value=10, value=3)
+            num_rooms = st.number_input("تعداد اتاق‌ها:", min_value=2, max_value=200, value=3)
+            
+            with st.expander("محدودیت‌های تقسیم"):
+                keep_apart_text = st.text_area("افرادی که نباید هم‌اتاق باشند (هر خط: نام‌کاربری۱، نام‌کاربری۲)")
+                keep_together_text = st.text_area("افرادی که باید هم‌اتاق باشند (هر خط: نام‌کاربری۱، نام‌کاربری۲)")
+                mix_by_scores = st.checkbox("ترکیب متوازن بر اساس نمرات کوئیز")
+                avoid_repeats = st.checkbox("پرهیز از تکرار گروه‌بندی‌های قبلی", value=True)
             
             if st.button("ایجاد اتاق‌ها", type="primary"):
-                # Divide participants automatically
-                room_size = len(participants) // num_rooms
+                from modules import breakout_assign
+                
+                groups = breakout_assign.assign(
+                    participants, num_rooms,
+                    keep_apart=parse_pairs(keep_apart_text),
+                    keep_together=parse_pairs(keep_together_text),
+                    scores=_participant_scores(st.session_state.room_id) if mix_by_scores else None,
+                    history=[g for session in load_breakout_history(st.session_state.room_id)
+                             for g in session] if avoid_repeats else (),
+                )
                 breakout_rooms = []
                 
-                for i in range(num_rooms):
-                    start_idx = i * room_size
-                    end_idx = start_idx + room_size if i < num_rooms - 1 else len(participants)
-                    
-                    room_participants = participants[start_idx:end_idx]
+                for i, room_participants in enumerate(groups):
                     breakout_rooms.append({
                         'id': f"breakout_{i+1}",
                         'name': f"اتاق {i+1}",
@@ -101,25 +308,28 @@ def show_teacher_breakout_view():
                         'created_at': datetime.now().isoformat()
                     })
                 
-                save_breakout_rooms(st.session_state.room_id, breakout_rooms)
-                st.success(f"{num_rooms} اتاق جانبی ایجاد شد!")
+                start_breakout_set(st.session_state.room_id, breakout_rooms, duration)
+                save_breakout_history(st.session_state.room_id, groups)
+                st.success(f"{len(breakout_rooms)} اتاق جانبی ایجاد شد!")
                 st.rerun()
         
         else:  # Manual assignment
-            num_rooms = st.number_input("تعداد اتاق‌ها:", min_value=2, max_value=10, value=3, key="manual_rooms")
+            num_rooms = st.number_input("تعداد اتاق‌ها:", min_value=2, max_value=200, value=3, key="manual_rooms")
             
-            from modules.auth import load_users
-            users = load_users()
+            from modules.user_index import get_user_index
+            index = get_user_index()
             
             room_assignments = {}
             for i in range(num_rooms):
                 st.write(f"### اتاق {i+1}")
                 room_name = st.text_input(f"نام اتاق {i+1}:", value=f"اتاق {i+1}", key=f"name_{i}")
+                query = st.text_input("جستجوی شرکت‌کننده:", key=f"search_{i}",
+                                      placeholder="نام یا نام کاربری...")
                 selected = st.multiselect(
                     f"انتخاب شرکت‌کنندگان:",
-                    participants,
+                    index.picker_options(query, participants, st.session_state.get(f"participants_{i}", [])),
                     key=f"participants_{i}",
-                    format_func=lambda x: users.get(x, {}).get('full_name', x)
+                    format_func=index.display_name
                 )
                 room_assignments[i] = {'name': room_name, 'participants': selected}
             
@@ -136,7 +346,8 @@ def show_teacher_breakout_view():
                         })
                 
                 if breakout_rooms:
-                    save_breakout_rooms(st.session_state.room_id, breakout_rooms)
+                    start_breakout_set(st.session_state.room_id, breakout_rooms, duration)
+                    save_breakout_history(st.session_state.room_id, [r['participants'] for r in breakout_rooms])
                     st.success("اتاق‌های جانبی ایجاد شد!")
                     st.rerun()
                 else:
@@ -154,6 +365,10 @@ def show_teacher_breakout_view():
         from modules.auth import load_users
         users = load_users()
         
+        deadlines = {r['deadline'] for r in breakout_rooms if r['status'] == 'active' and r.get('deadline')}
+        for deadline in sorted(deadlines):
+            st.caption(f"⏱️ بازگشت خودکار همه به کلاس در ساعت {datetime.fromisoformat(deadline).strftime('%H:%M')}")
+        
         for room in breakout_rooms:
             with st.expander(f"🚪 {room['name']} ({len(room['participants'])} نفر)"):
                 st.write("**شرکت‌کنندگان:**")
@@ -165,12 +380,16 @@ def show_teacher_breakout_view():
                 
                 with col1:
                     if st.button("ورود به اتاق", key=f"enter_{room['id']}"):
-                        st.info("شما وارد اتاق شدید")
+                        classroom.enter_subroom(room['id'])
+                        st.success("گفتگو، تخته سفید و فایل‌ها اکنون مربوط به این اتاق هستند")
                 
                 with col2:
-                    if st.button("ارسال پیام", key=f"msg_{room['id']}"):
+                    with st.form(f"msg_form_{room['id']}", clear_on_submit=True):
                         msg = st.text_input("پیام:", key=f"msgtext_{room['id']}")
-                        if msg:
+                        if st.form_submit_button("ارسال پیام") and msg.strip():
+                            breakout_broadcast.send_broadcast(
+                                st.session_state.room_id, st.session_state.username,
+                                msg.strip(), [room['id']])
                             st.success("پیام ارسال شد")
                 
                 with col3:
@@ -182,13 +401,32 @@ def show_teacher_breakout_view():
         
         st.divider()
         
+        # Broadcast to several rooms: stored once with its recipient set
+        st.write("**ارسال پیام همگانی**")
+        with st.form("broadcast_form", clear_on_submit=True):
+            active_rooms = {r['id']: r['name'] for r in breakout_rooms if r['status'] == 'active'}
+            targets = st.multiselect(
+                "اتاق‌های گیرنده (خالی = همه اتاق‌ها):",
+                list(active_rooms),
+                format_func=active_rooms.get,
+            )
+            message = st.text_area("متن پیام:")
+            if st.form_submit_button("ارسال به اتاق‌ها", type="primary"):
+                if message.strip():
+                    breakout_broadcast.send_broadcast(
+                        st.session_state.room_id, st.session_state.username, message.strip(),
+                        targets or breakout_broadcast.ALL_ROOMS)
+                    st.success("پیام ارسال شد")
+                else:
+                    st.warning("متن پیام را وارد کنید")
+        
+        st.divider()
+        
         # Global controls
         col1, col2 = st.columns(2)
         with col1:
             if st.button("بستن همه اتاق‌ها", type="primary"):
-                for room in breakout_rooms:
-                    room['status'] = 'closed'
-                save_breakout_rooms(st.session_state.room_id, breakout_rooms)
+                close_breakout_set(st.session_state.room_id)
                 st.success("همه اتاق‌ها بسته شد")
                 st.rerun()
         
@@ -203,44 +441,55 @@ def show_student_breakout_view():
     
     st.subheader("اتاق جانبی من")
     
-    breakout_rooms = load_breakout_rooms(st.session_state.room_id)
-    active_rooms = [r for r in breakout_rooms if r['status'] == 'active']
-    
-    if not active_rooms:
-        st.info("هنوز اتاق جانبی ایجاد نشده است")
-        return
-    
-    # Find user's assigned room
-    user_room = None
-    for room in active_rooms:
-        if st.session_state.username in room['participants']:
-            user_room = room
-            break
+    # Find user's assigned room through the reverse index
+    user_room = find_user_breakout(st.session_state.room_id, st.session_state.username)
     
     if not user_room:
-        st.warning("شما به هیچ اتاق جانبی اختصاص داده نشده‌اید")
+        st.info("شما در حال حاضر به هیچ اتاق جانبی فعالی اختصاص داده نشده‌اید")
         return
     
     st.success(f"شما به **{user_room['name']}** اختصاص داده شده‌اید")
     
+    if user_room.get('deadline'):
+        fragment = getattr(st, "fragment", None)
+        if fragment is not None:
+            fragment(run_every=1)(show_countdown)(user_room)
+        else:
+            show_countdown(user_room)
+    
     st.write("### اعضای اتاق:")
-    from modules.auth import load_users
-    users = load_users()
+    from modules.user_index import get_user_index
+    index = get_user_index()
     
     for participant in user_room['participants']:
-        user_info = users.get(participant, {})
         col1, col2 = st.columns([4, 1])
         with col1:
-            st.write(f"👤 {user_info.get('full_name', participant)}")
+            st.write(f"👤 {index.display_name(participant)}")
         with col2:
             if participant == st.session_state.username:
                 st.write("(شما)")
     
     st.divider()
     
-    # Room chat
-    st.write("### گفتگوی اتاق")
-    st.info("از منوی گفتگو برای چت در این اتاق استفاده کنید")
+    st.write("### پیام‌های مدرس")
+    fragment = getattr(st, "fragment", None)
+    if fragment is not None:
+        fragment(run_every=BROADCAST_POLL_INTERVAL)(show_broadcasts)(st.session_state.room_id, user_room)
+    else:
+        show_broadcasts(st.session_state.room_id, user_room)
+    
+    st.divider()
     
-    if st.button("ورود به اتاق", type="primary"):
-        st.success("شما وارد اتاق شدید!")
\ No newline at end of file
+    # Room chat, whiteboard and files live in the breakout room's own namespace
+    st.write("### گفتگوی اتاق")
+    subroom_id = classroom.make_subroom_id(st.session_state.room_id, user_room['id'])
+    if classroom.active_room_id() == subroom_id:
+        st.info("شما در این اتاق هستید؛ گفتگو، تخته سفید و فایل‌ها مربوط به همین اتاق است")
+        if st.button("بازگشت به کلاس اصلی"):
+            classroom.leave_subroom()
+            st.rerun()
+    else:
+        st.info("برای گفتگو و کار روی تخته سفید اختصاصی اتاق وارد شوید")
+        if st.button("ورود به اتاق", type="primary"):
+            classroom.enter_subroom(user_room['id'])
+            st.rerun()
\ No newline at end of file
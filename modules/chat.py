@@ -5,11 +5,19 @@ Chat Module
 
 import streamlit as st
 from modules import ui
+from modules import moderation
+from modules import classroom
+from modules import storage
 import json
+import threading
 from pathlib import Path
 from datetime import datetime
 
 CHAT_FILE = Path("data/chats.json")
+# Breakout room chats: data/chats/<class id>/<breakout id>.json
+CHAT_DIR = Path("data/chats")
+
+_subroom_lock = threading.Lock()
 
 
 def init_chat_db():
@@ -20,8 +28,27 @@ def init_chat_db():
             json.dump({}, f, ensure_ascii=False)
 
 
+def _subroom_chat_path(room_id):
+    """Chat file of a breakout room, or None for a main class.
+
+    Each breakout room has its own file so parallel breakout chats never
+    rewrite the class's shared chat file or each other's.
+    """
+    parent, breakout_id = classroom.split_room_id(room_id)
+    if breakout_id is None:
+        return None
+    return CHAT_DIR / parent / f"{breakout_id}.json"
+
+
 def load_chats(room_id):
-    """Return list of messages for a room"""
+    """Return list of messages for a room or breakout sub-room"""
+    path = _subroom_chat_path(room_id)
+    if path is not None:
+        if not path.exists():
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
     init_chat_db()
     with open(CHAT_FILE, "r", encoding="utf-8") as f:
         all_chats = json.load(f)
@@ -30,13 +57,6 @@ def load_chats(room_id):
 
 def save_message(room_id, username, message, message_type="public", to=None):
     """Save a message. 'to' is optional recipient for private messages."""
-    init_chat_db()
-    with open(CHAT_FILE, "r", encoding="utf-8") as f:
-        all_chats = json.load(f)
-
-    if room_id not in all_chats:
-        all_chats[room_id] = []
-
     entry = {
         "username": username,
         "message": message,
@@ -46,6 +66,22 @@ def save_message(room_id, username, message, message_type="public", to=None):
     if to:
         entry["to"] = to
 
+    path = _subroom_chat_path(room_id)
+    if path is not None:
+        # Serialize read-append-write so members posting together keep both messages
+        with _subroom_lock:
+            messages = load_chats(room_id)
+            messages.append(entry)
+            storage.write_json_atomic(path, messages)
+        return
+
+    init_chat_db()
+    with open(CHAT_FILE, "r", encoding="utf-8") as f:
+        all_chats = json.load(f)
+
+    if room_id not in all_chats:
+        all_chats[room_id] = []
+
     all_chats[room_id].append(entry)
 
     with open(CHAT_FILE, "w", encoding="utf-8") as f:
@@ -56,7 +92,7 @@ def show():
     """Top-level chat UI with public and private tabs"""
     st.title("💬 گفتگو")
 
-    room_id = st.session_state.get("room_id")
+    room_id = classroom.active_room_id()
     username = st.session_state.get("username")
 
     if not room_id:
@@ -95,6 +131,13 @@ def _render_message_bubble(msg, current_user):
     st.markdown(html, unsafe_allow_html=True)
 
 
+def _can_chat(room_id, username):
+    """Teachers can always chat; students need the chat permission"""
+    if st.session_state.get("user_role") == "مدرس":
+        return True
+    return moderation.is_allowed(classroom.parent_room_id(room_id), username, moderation.CHAT_ALLOWED)
+
+
 def show_public_chat(room_id, username):
     st.subheader("گفتگوی عمومی")
 
@@ -106,6 +149,10 @@ def show_public_chat(room_id, username):
         for msg in public_messages:
             _render_message_bubble(msg, username)
 
+    if not _can_chat(room_id, username):
+        st.info("ارسال پیام توسط مدرس غیرفعال شده است")
+        return
+
     # Public message input
     with st.form("public_chat_form", clear_on_submit=True):
         col1, col2 = st.columns([4, 1])
@@ -134,23 +181,39 @@ def show_public_chat(room_id, username):
 def show_private_chat(room_id, username):
     st.subheader("پیام خصوصی")
 
-    # Load room participants
-    from modules.classroom import load_rooms
-    rooms = load_rooms()
+    # Load room participants (a breakout room's own members plus the teacher)
+    parent, breakout_id = classroom.split_room_id(room_id)
+    rooms = classroom.load_rooms()
 
-    if room_id not in rooms:
+    if parent not in rooms:
         st.error("کلاس یافت نشد")
         return
 
-    room = rooms[room_id]
-    participants = room.get("participants", []) + [room.get("teacher")]
+    room = rooms[parent]
+    members = room.get("participants", [])
+    if breakout_id is not None:
+        from modules.breakout_rooms import load_breakout_rooms
+        breakout = next((r for r in load_breakout_rooms(parent) if r['id'] == breakout_id), None)
+        members = breakout['participants'] if breakout else []
+    participants = members + [room.get("teacher")]
     participants = [p for p in participants if p and p != username]
 
     if not participants:
         st.info("هیچ شرکت‌کننده دیگری در کلاس نیست")
         return
 
-    selected_user = st.selectbox("انتخاب کاربر:", participants)
+    from modules.user_index import get_user_index
+    index = get_user_index()
+    query = st.text_input("جستجوی کاربر:", key="private_chat_search", placeholder="نام یا نام کاربری...")
+    options = index.picker_options(query, participants)
+    if not options and not query.strip():
+        st.info("برای یافتن کاربر، بخشی از نام یا نام کاربری را وارد کنید")
+        return
+    if not options:
+        st.info("کاربری با این مشخصات یافت نشد")
+        return
+
+    selected_user = st.selectbox("انتخاب کاربر:", options, format_func=index.display_name)
 
     messages = load_chats(room_id)
     # Show only private messages between current user and selected_user
@@ -166,6 +229,10 @@ def show_private_chat(room_id, username):
         for msg in private_messages:
             _render_message_bubble(msg, username)
 
+    if not _can_chat(room_id, username):
+        st.info("ارسال پیام توسط مدرس غیرفعال شده است")
+        return
+
     # Private message input
     with st.form("private_chat_form", clear_on_submit=True):
         col1, col2 = st.columns([4, 1])
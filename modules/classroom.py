@@ -7,9 +7,16 @@ import streamlit as st
 import json
 from pathlib import Path
 from datetime import datetime
+from modules.auth import persist_session
+from modules import presence
+from modules import moderation
+from modules import waiting_room
 
 ROOMS_FILE = Path("data/rooms.json")
 
+# Separates a class id from a breakout room id in namespaced sub-room ids
+SUBROOM_SEPARATOR = "/"
+
 def init_rooms_db():
     """Initialize rooms database"""
     ROOMS_FILE.parent.mkdir(exist_ok=True)
@@ -30,6 +37,60 @@ def save_room(room_data):
     with open(ROOMS_FILE, 'w', encoding='utf-8') as f:
         json.dump(rooms, f, ensure_ascii=False, indent=2)
 
+def online_participants(room):
+    """Return participants of a room that are currently online (teacher excluded)"""
+    return presence.online_users(room['id']) - {room['teacher']}
+
+def is_room_full(room, username=None):
+    """Check room capacity against live presence rather than the joined list"""
+    online = online_participants(room)
+    if username in online:
+        return False
+    return len(online) >= room['max_participants']
+
+def make_subroom_id(room_id, breakout_id):
+    """Namespaced id of a breakout room inside a class, e.g. ``room_1/breakout_2``"""
+    return f"{room_id}{SUBROOM_SEPARATOR}{breakout_id}"
+
+def split_room_id(room_id):
+    """Return (class id, breakout id or None) for a room or sub-room id"""
+    parent, _, breakout_id = room_id.partition(SUBROOM_SEPARATOR)
+    return parent, breakout_id or None
+
+def parent_room_id(room_id):
+    """Class id of a room or sub-room id"""
+    return split_room_id(room_id)[0]
+
+def enter_subroom(breakout_id):
+    """Move the user's chat, whiteboard and files into a breakout room"""
+    st.session_state.subroom_id = make_subroom_id(st.session_state.room_id, breakout_id)
+
+def leave_subroom():
+    """Return the user to the main class"""
+    st.session_state.subroom_id = None
+
+def active_room_id():
+    """Room id that chat, whiteboard and files should use for the current user.
+
+    This is the namespaced sub-room id while the user is inside a breakout
+    room of the active class, otherwise the class id. A student whose
+    breakout room was closed or reassigned falls back to the main class.
+    """
+    room_id = st.session_state.get('room_id')
+    subroom_id = st.session_state.get('subroom_id')
+    if not room_id or not subroom_id:
+        return room_id
+    parent, breakout_id = split_room_id(subroom_id)
+    if parent != room_id:
+        return room_id
+    if st.session_state.get('user_role') != "مدرس":
+        from modules.breakout_rooms import find_user_breakout
+        user_room = find_user_breakout(room_id, st.session_state.username)
+        if not user_room or user_room['id'] != breakout_id:
+            leave_subroom()
+            return room_id
+    return subroom_id
+
 def show():
     """Show classroom interface"""
     st.title("📚 کلاس درس")
@@ -47,6 +108,7 @@ def show_teacher_view():
         st.subheader("ایجاد کلاس جدید")
         with st.form("create_room"):
             room_name = st.text_input("نام کلاس")
+            course_name = st.text_input("نام درس (جلسات یک درس کارنامه مشترک دارند)")
             room_desc = st.text_area("توضیحات")
             max_participants = st.number_input("حداکثر تعداد شرکت‌کنندگان", min_value=2, max_value=100, value=30)
             password = st.text_input("رمز عبور (اختیاری)", type="password")
@@ -60,6 +122,7 @@ def show_teacher_view():
             enable_chat = st.checkbox("فعال‌سازی چت", value=True)
             enable_whiteboard = st.checkbox("فعال‌سازی تخته سفید", value=True)
             enable_screen_share = st.checkbox("فعال‌سازی اشتراک صفحه", value=True)
+            enable_waiting_room = st.checkbox("فعال‌سازی اتاق انتظار (ورود با تأیید مدرس)", value=False)
             
             submit = st.form_submit_button("ایجاد کلاس")
             
@@ -68,6 +131,7 @@ def show_teacher_view():
                 room_data = {
                     'id': room_id,
                     'name': room_name,
+                    'course': course_name or room_name,
                     'description': room_desc,
                     'teacher': st.session_state.username,
                     'max_participants': max_participants,
@@ -81,6 +145,7 @@ def show_teacher_view():
                     },
                     'created_at': datetime.now().isoformat(),
                     'participants': [],
+                    'waiting_room': enable_waiting_room,
                     'status': 'scheduled'
                 }
                 save_room(room_data)
@@ -96,7 +161,7 @@ def show_teacher_view():
                 with st.expander(f"📖 {room['name']} - {room_id}"):
                     st.write(f"**توضیحات:** {room['description']}")
                     st.write(f"**تاریخ:** {room['start_date']} - ساعت: {room['start_time']}")
-                    st.write(f"**شرکت‌کنندگان:** {len(room['participants'])} / {room['max_participants']}")
+                    st.write(f"**شرکت‌کنندگان آنلاین:** {len(online_participants(room))} / {room['max_participants']}")
                     st.write(f"**وضعیت:** {room['status']}")
                     
                     col1, col2, col3 = st.columns(3)
@@ -105,6 +170,7 @@ def show_teacher_view():
                             room['status'] = 'active'
                             save_room(room)
                             st.session_state.room_id = room_id
+                            persist_session()
                             st.success("کلاس شروع شد!")
                             st.rerun()
                     with col2:
@@ -124,10 +190,54 @@ def show_teacher_view():
         else:
             st.info("شما هنوز کلاسی ایجاد نکرده‌اید")
 
+def _join_room(room):
+    """Add the current user to a room and make it the active class"""
+    if st.session_state.username not in room['participants']:
+        room['participants'].append(st.session_state.username)
+        save_room(room)
+    st.session_state.room_id = room['id']
+    persist_session()
+
+def show_waiting_status(room_id):
+    """Show the student's place in the waiting room until the teacher decides"""
+    username = st.session_state.username
+    result = waiting_room.decision(room_id, username)
+
+    if result == waiting_room.APPROVED:
+        rooms = load_rooms()
+        st.session_state.waiting_room_id = None
+        if room_id in rooms:
+            _join_room(rooms[room_id])
+        st.rerun()
+    elif result == waiting_room.DENIED:
+        st.session_state.waiting_room_id = None
+        st.error("درخواست ورود شما توسط مدرس رد شد")
+        return
+
+    pos = waiting_room.position(room_id, username)
+    if pos is None:
+        st.session_state.waiting_room_id = None
+        st.rerun()
+    st.info(f"⏳ در انتظار تأیید مدرس... جایگاه شما در صف: {pos}")
+    if st.button("انصراف از ورود", key="cancel_waiting"):
+        waiting_room.cancel(room_id, username)
+        st.session_state.waiting_room_id = None
+        st.rerun()
+
 def show_student_view():
     """Show student classroom view"""
     st.subheader("ورود به کلاس")
     
+    waiting_room_id = st.session_state.get('waiting_room_id')
+    if waiting_room_id:
+        # Refresh the queue position without a full page rerun when supported
+        fragment = getattr(st, "fragment", None)
+        if fragment is not None:
+            fragment(run_every=3)(show_waiting_status)(waiting_room_id)
+        else:
+            show_waiting_status(waiting_room_id)
+        return
+    
     col1, col2 = st.columns([2, 1])
     with col1:
         room_code = st.text_input("کد کلاس را وارد کنید")
@@ -140,15 +250,20 @@ def show_student_view():
             room = rooms[room_code]
             if room['password'] and room['password'] != room_password:
                 st.error("رمز عبور اشتباه است")
-            elif len(room['participants']) >= room['max_participants']:
+            elif moderation.is_blocked(room_code, st.session_state.username):
+                st.error("دسترسی شما به این کلاس توسط مدرس مسدود شده است")
+            elif is_room_full(room, st.session_state.username):
                 st.error("ظرفیت کلاس تکمیل است")
             elif room['status'] != 'active':
                 st.warning("این کلاس هنوز شروع نشده است")
+            elif (room.get('waiting_room') and
+                  st.session_state.username not in room['participants'] and
+                  waiting_room.decision(room_code, st.session_state.username) != waiting_room.APPROVED):
+                waiting_room.enqueue(room_code, st.session_state.username, st.session_state.get('full_name'))
+                st.session_state.waiting_room_id = room_code
+                st.rerun()
             else:
-                if st.session_state.username not in room['participants']:
-                    room['participants'].append(st.session_state.username)
-                    save_room(room)
-                st.session_state.room_id = room_code
+                _join_room(room)
                 st.success(f"به کلاس {room['name']} خوش آمدید!")
                 st.rerun()
         else:
@@ -164,7 +279,7 @@ def show_student_view():
             with st.expander(f"📖 {room['name']}"):
                 st.write(f"**مدرس:** {room['teacher']}")
                 st.write(f"**توضیحات:** {room['description']}")
-                st.write(f"**شرکت‌کنندگان:** {len(room['participants'])} / {room['max_participants']}")
+                st.write(f"**شرکت‌کنندگان آنلاین:** {len(online_participants(room))} / {room['max_participants']}")
                 st.code(f"کد کلاس: {room_id}")
                 # Guest join option for students without password
                 st.write("---")
@@ -172,7 +287,7 @@ def show_student_view():
                 guest_name_key = f"guest_name_{room_id}"
                 guest_name = st.text_input("نام نمایشی (اختیاری)", value="مهمان", key=guest_name_key)
                 if st.button("ورود به‌عنوان مهمان", key=f"guest_join_{room_id}"):
-                    if len(room['participants']) >= room['max_participants']:
+                    if is_room_full(room):
                         st.error("ظرفیت کلاس تکمیل است")
                     else:
                         # create a guest username and set session state without password
@@ -187,6 +302,7 @@ def show_student_view():
                         st.session_state.user_role = "دانش‌آموز"
                         st.session_state.full_name = display_name
                         st.session_state.room_id = room_id
+                        persist_session()
                         st.success(f"شما به عنوان {display_name} وارد کلاس {room['name']} شدید")
                         st.rerun()
     else:
@@ -8,8 +8,12 @@ from pathlib import Path
 import json
 from datetime import datetime
 import os
+from modules import classroom
+from modules import storage
 
 FILES_DB = Path("data/files.json")
+# Breakout room files: data/files/<class id>/<breakout id>.json
+FILES_DIR = Path("data/files")
 
 def init_files_db():
     """Initialize files database"""
@@ -18,46 +22,74 @@ def init_files_db():
         with open(FILES_DB, 'w', encoding='utf-8') as f:
             json.dump({}, f, ensure_ascii=False)
 
+def _subroom_files_path(room_id):
+    """File list of a breakout room, or None for a main class"""
+    parent, breakout_id = classroom.split_room_id(room_id)
+    if breakout_id is None:
+        return None
+    return FILES_DIR / parent / f"{breakout_id}.json"
+
 def load_files(room_id):
-    """Load files for a room"""
+    """Load files for a room or breakout sub-room"""
+    path = _subroom_files_path(room_id)
+    if path is not None:
+        if not path.exists():
+            return []
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
     init_files_db()
     with open(FILES_DB, 'r', encoding='utf-8') as f:
         all_files = json.load(f)
     return all_files.get(room_id, [])
 
-def save_file_info(room_id, file_info):
-    """Save file information"""
+def _save_files(room_id, files):
+    """Replace the file list of a room or breakout sub-room"""
+    path = _subroom_files_path(room_id)
+    if path is not None:
+        storage.write_json_atomic(path, files)
+        return
+    
     init_files_db()
     with open(FILES_DB, 'r', encoding='utf-8') as f:
         all_files = json.load(f)
     
-    if room_id not in all_files:
-        all_files[room_id] = []
-    
-    all_files[room_id].append(file_info)
+    all_files[room_id] = files
     
     with open(FILES_DB, 'w', encoding='utf-8') as f:
         json.dump(all_files, f, ensure_ascii=False, indent=2)
 
+def save_file_info(room_id, file_info):
+    """Save file information"""
+    files = load_files(room_id)
+    files.append(file_info)
+    _save_files(room_id, files)
+
+def remove_file_info(room_id, file_info):
+    """Remove a file's entry from a room without touching other rooms"""
+    files = [f for f in load_files(room_id) if f['path'] != file_info['path']]
+    _save_files(room_id, files)
+
 def show():
     """Show file manager interface"""
     st.title("📁 مدیریت فایل")
     
-    if not st.session_state.room_id:
+    room_id = classroom.active_room_id()
+    if not room_id:
         st.warning("ابتدا باید وارد یک کلاس شوید")
         return
     
-    st.info(f"کلاس فعال: {st.session_state.room_id}")
+    st.info(f"کلاس فعال: {room_id}")
     
     tab1, tab2 = st.tabs(["آپلود فایل", "فایل‌های کلاس"])
     
     with tab1:
-        show_upload_section()
+        show_upload_section(room_id)
     
     with tab2:
-        show_files_list()
+        show_files_list(room_id)
 
-def show_upload_section():
+def show_upload_section(room_id):
     """Show file upload section"""
     st.subheader("آپلود فایل جدید")
     
@@ -86,12 +118,11 @@ def show_upload_section():
         
         if st.button("آپلود فایل", type="primary"):
             # Save file
-            file_dir = Path(f"data/uploads/{st.session_state.room_id}")
+            file_dir = Path(f"data/uploads/{room_id}")
             file_dir.mkdir(parents=True, exist_ok=True)
             
             file_path = file_dir / uploaded_file.name
-            with open(file_path, 'wb') as f:
-                f.write(uploaded_file.getbuffer())
+            storage.write_stream_atomic(file_path, uploaded_file)
             
             # Save file info to database
             file_info = {
@@ -103,16 +134,16 @@ def show_upload_section():
                 'upload_date': datetime.now().isoformat(),
                 'path': str(file_path)
             }
-            save_file_info(st.session_state.room_id, file_info)
+            save_file_info(room_id, file_info)
             
             st.success(f"فایل {uploaded_file.name} با موفقیت آپلود شد!")
             st.rerun()
 
-def show_files_list():
+def show_files_list(room_id):
     """Show list of uploaded files"""
     st.subheader("فایل‌های آپلود شده")
     
-    files = load_files(st.session_state.room_id)
+    files = load_files(room_id)
     
     if not files:
         st.info("هنوز فایلی آپلود نشده است")
@@ -169,9 +200,6 @@ def show_files_list():
                         st.session_state.user_role == "مدرس"):
                         if st.button("🗑️ حذف", key=f"delete_{idx}"):
                             os.remove(file_path)
-                            files.remove(file)
-                            with open(FILES_DB, 'w', encoding='utf-8') as f:
-                                json.dump({st.session_state.room_id: files}, f, 
-                                        ensure_ascii=False, indent=2)
+                            remove_file_info(room_id, file)
                             st.success("فایل حذف شد")
                             st.rerun()
@@ -0,0 +1,101 @@
+"""
+ماژول نمره‌دهی کوئیزها و کارنامه
+Quiz Grading and Gradebook Module
+"""
+
+import numpy as np
+
+from modules import poll_tally
+
+def answer_key(poll):
+    """Boolean vector over the options marking the correct answers"""
+    key = np.zeros(len(poll['options']), dtype=bool)
+    correct = poll.get('correct_answers')
+    if correct is None and poll.get('correct_answer') is not None:
+        correct = [poll['correct_answer']]
+    for idx in correct or []:
+        if 0 <= idx < len(key):
+            key[idx] = True
+    return key
+
+def is_gradable(poll):
+    """A poll can be graded once it has at least one correct answer"""
+    return bool(answer_key(poll).any())
+
+def response_matrix(poll):
+    """Return (usernames, selections) with selections a users x options bool matrix"""
+    usernames = list(poll['responses'])
+    rows = []
+    cols = []
+    for row, username in enumerate(usernames):
+        for idx in poll_tally.response_indices(poll, poll['responses'][username]):
+            rows.append(row)
+            cols.append(idx)
+    selections = np.zeros((len(usernames), len(poll['options'])), dtype=bool)
+    selections[np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)] = True
+    return usernames, selections
+
+def grade_quiz(poll):
+    """Score every response of a quiz in one vectorized pass.
+
+    Returns (usernames, scores) with scores in [0, 1]. Multi-select quizzes
+    get partial credit: (correct picks - wrong picks) / number of correct
+    answers, floored at zero. Single-select quizzes score 1 for any correct
+    pick.
+    """
+    key = answer_key(poll)
+    usernames, selections = response_matrix(poll)
+    if not key.any() or not usernames:
+        return usernames, np.zeros(len(usernames))
+
+    hits = (selections & key).sum(axis=1)
+    if poll.get('allow_multiple'):
+        wrong = (selections & ~key).sum(axis=1)
+        scores = np.clip((hits - wrong) / key.sum(), 0.0, 1.0)
+    else:
+        scores = (hits > 0).astype(float)
+    return usernames, scores
+
+def build_gradebook(quizzes):
+    """Aggregate quiz scores per student across quizzes.
+
+    Returns (students, quiz_ids, scores, totals): ``scores`` is a
+    students x quizzes matrix with NaN where a student did not answer, and
+    ``totals`` is each student's percentage over all quizzes (unanswered
+    quizzes count as zero).
+    """
+    student_index = {}
+    graded = []
+    for poll in quizzes:
+        usernames, scores = grade_quiz(poll)
+        rows = np.fromiter(
+            (student_index.setdefault(u, len(student_index)) for u in usernames),
+            dtype=np.intp, count=len(usernames),
+        )
+        graded.append((rows, scores))
+
+    students = list(student_index)
+    matrix = np.full((len(students), len(graded)), np.nan)
+    for col, (rows, scores) in enumerate(graded):
+        matrix[rows, col] = scores
+
+    if graded:
+        totals = np.nan_to_num(matrix).sum(axis=1) / len(graded) * 100
+    else:
+        totals = np.zeros(len(students))
+    return students, [poll['id'] for poll in quizzes], matrix, totals
+
+def course_quizzes(rooms, all_polls, course, teacher=None):
+    """Collect the gradable polls of every room that belongs to a course"""
+    quizzes = []
+    for room_id, room in rooms.items():
+        if room_course(room) != course:
+            continue
+        if teacher is not None and room.get('teacher') != teacher:
+            continue
+        quizzes.extend(p for p in all_polls.get(room_id, []) if is_gradable(p))
+    return quizzes
+
+def room_course(room):
+    """Course name of a room (rooms without one form their own course)"""
+    return room.get('course') or room['name']
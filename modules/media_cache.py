@@ -0,0 +1,144 @@
+"""
+ماژول حافظه نهان رسانه
+Shared Media Cache Module
+
+Published whiteboard and screen-share files are read by every student
+session on every refresh. This process-wide LRU cache keeps their bytes
+keyed by (path, mtime, size, inode), so all sessions share one immutable
+copy. The cache is bounded by total bytes, and a file that changes on disk
+simply gets a new key; the stale entry is dropped at once.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from modules import storage
+
+# Total bytes kept in memory (override with MEDIA_CACHE_BYTES)
+MEDIA_CACHE_BYTES = int(os.environ.get("MEDIA_CACHE_BYTES", 256 * 1024 * 1024))
+
+# Files larger than this share of the cap are read but never cached
+MAX_ITEM_SHARE = 0.25
+
+class MediaCache:
+    """Byte-bounded LRU of file contents"""
+
+    def __init__(self, max_bytes=MEDIA_CACHE_BYTES, max_item_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes or int(max_bytes * MAX_ITEM_SHARE)
+        self._entries = OrderedDict()
+        self._keys_by_path = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.uncacheable = 0
+
+    def get(self, path):
+        """Return the file's bytes, or None if it does not exist.
+
+        Concurrent misses for the same version are read from disk once.
+        """
+        path = str(path)
+        version = storage.file_version(path)
+        if version is None:
+            self._drop_path(path)
+            return None
+        key = (path, version)
+
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            pending = self._loading.get(key)
+            if pending is None:
+                pending = self._loading[key] = {'done': threading.Event(), 'data': None}
+                self.misses += 1
+                loader = True
+            else:
+                self.hits += 1
+                loader = False
+
+        if not loader:
+            # Another session is reading this version; share its result
+            pending['done'].wait()
+            return pending['data']
+
+        data = None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            self._store(path, key, data)
+        except FileNotFoundError:
+            pass
+        finally:
+            pending['data'] = data
+            with self._lock:
+                del self._loading[key]
+            pending['done'].set()
+        return data
+
+    def _store(self, path, key, data):
+        with self._lock:
+            # Drop the previous version first, even if the new one is too big to keep
+            stale = self._keys_by_path.get(path)
+            if stale is not None and stale != key:
+                self._remove(stale)
+            if len(data) > self.max_item_bytes:
+                self.uncacheable += 1
+                return
+            if key not in self._entries:
+                self._entries[key] = data
+                self._keys_by_path[path] = key
+                self.size += len(data)
+            while self.size > self.max_bytes and self._entries:
+                old_key, old_data = self._entries.popitem(last=False)
+                self.size -= len(old_data)
+                self._keys_by_path.pop(old_key[0], None)
+                self.evictions += 1
+                self.evicted_bytes += len(old_data)
+
+    def _remove(self, key):
+        data = self._entries.pop(key, None)
+        if data is not None:
+            self.size -= len(data)
+        if self._keys_by_path.get(key[0]) == key:
+            del self._keys_by_path[key[0]]
+
+    def _drop_path(self, path):
+        with self._lock:
+            key = self._keys_by_path.get(path)
+            if key is not None:
+                self._remove(key)
+
+    def stats(self):
+        """Counters for monitoring the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'evicted_bytes': self.evicted_bytes,
+                'uncacheable': self.uncacheable,
+            }
+
+_cache = MediaCache()
+
+def read_media(path):
+    """Bytes of a published media file shared by every session (None if missing)"""
+    return _cache.get(path)
+
+def cache_stats():
+    """Hit, miss and eviction counters of the shared media cache"""
+    return _cache.stats()
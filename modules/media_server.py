@@ -0,0 +1,199 @@
+"""
+ماژول سرور رسانه
+Media Server Module
+
+A small threaded HTTP server, started once per process next to Streamlit,
+that serves shared videos and recordings with HTTP Range support. Files are
+memory-mapped and sent in slices, so seeking is a byte-range request and
+many viewers never pull whole videos into the Python heap. URLs are signed
+with the session secret and expire.
+
+The server is used only when MEDIA_SERVER_URL is set, because the address
+browsers can reach (host name, TLS proxy) depends on the deployment. Without
+it, or if the port cannot be bound, players fall back to st.video(path).
+
+Configuration (environment):
+    MEDIA_SERVER_URL    public base URL browsers use, e.g. https://class.example.org/media
+    MEDIA_SERVER_PORT   port to listen on (default 8502)
+    MEDIA_SERVER_HOST   interface to bind (default 0.0.0.0)
+"""
+
+import mimetypes
+import mmap
+import os
+import re
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import quote, unquote, urlencode, urlsplit, parse_qs
+
+from modules import auth
+from modules import storage
+
+MEDIA_SERVER_PORT = int(os.environ.get("MEDIA_SERVER_PORT", 8502))
+MEDIA_SERVER_HOST = os.environ.get("MEDIA_SERVER_HOST", "0.0.0.0")
+MEDIA_SERVER_URL = os.environ.get("MEDIA_SERVER_URL", "").rstrip("/")
+
+# URL prefix -> directory served under it
+MEDIA_ROOTS = {
+    'share': Path("data/screen_share"),
+    'recordings': Path("recordings"),
+}
+
+URL_TTL = 6 * 60 * 60  # seconds
+SEND_CHUNK = 256 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_server = None
+_server_lock = threading.Lock()
+
+class RangeNotSatisfiable(ValueError):
+    """A well-formed single range that lies outside the file"""
+
+def parse_range(header, size):
+    """Return (start, end) inclusive for a single byte range, or None for the whole file.
+
+    A missing, multi-range or malformed header is ignored (the whole file is
+    sent with 200, as RFC 9110 allows). Raises RangeNotSatisfiable when a
+    single range starts past the end of the file.
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or not (match.group(1) or match.group(2)) or size == 0:
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None  # invalid range-spec: ignored
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, min(int(last), size - 1) if last else size - 1
+
+def _signed_path(url_path, expires):
+    return f"{url_path}:{expires}"
+
+def resolve(url_path):
+    """Map a URL path like /share/x.mp4 to a file inside a media root, or None"""
+    parts = unquote(url_path).lstrip("/").split("/", 1)
+    if len(parts) != 2 or parts[0] not in MEDIA_ROOTS:
+        return None
+    root = MEDIA_ROOTS[parts[0]].resolve()
+    path = (root / parts[1]).resolve()
+    if root not in path.parents or not path.is_file():
+        return None
+    return path
+
+class MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MediaServer/1.0"
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _error(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _serve(self, send_body):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        expires = query.get("exp", ["0"])[0]
+        signature = query.get("sig", [""])[0]
+        if (not expires.isdigit() or int(expires) < time.time() or
+                not auth.verify_message(_signed_path(url.path, expires), signature)):
+            return self._error(HTTPStatus.FORBIDDEN)
+
+        path = resolve(url.path)
+        if path is None:
+            return self._error(HTTPStatus.NOT_FOUND)
+
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            try:
+                byte_range = parse_range(self.headers.get("Range"), size)
+            except RangeNotSatisfiable:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            partial = byte_range is not None
+            start, end = byte_range if partial else (0, size - 1)
+            self.send_response(HTTPStatus.PARTIAL_CONTENT if partial else HTTPStatus.OK)
+            self.send_header("Content-Type", mimetypes.guess_type(path.name)[0] or "application/octet-stream")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Cache-Control", "private, max-age=3600")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            version = storage.file_version(path)
+            if version:
+                self.send_header("ETag", f'"{version[0]:x}-{version[1]:x}"')
+            if partial:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+            if not send_body or not size:
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for offset in range(start, end + 1, SEND_CHUNK):
+                        self.wfile.write(view[offset:min(offset + SEND_CHUNK, end + 1)])
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # viewer seeked away or closed the player
+                finally:
+                    view.release()
+
+def start_server():
+    """Start the media server once per process; returns False if it cannot listen.
+
+    A failed bind (e.g. the port belongs to another app) is remembered, so
+    callers fall back to st.video(path) without retrying on every rerun.
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return bool(_server)
+        try:
+            server = ThreadingHTTPServer((MEDIA_SERVER_HOST, MEDIA_SERVER_PORT), MediaHandler)
+        except OSError:
+            _server = False
+            return False
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="media-server", daemon=True).start()
+        _server = server
+        return True
+
+def media_url(path, ttl=URL_TTL):
+    """Signed, expiring URL of a file under a media root, or None if it cannot be served"""
+    if not MEDIA_SERVER_URL:
+        return None
+    path = Path(path).resolve()
+    for prefix, root in MEDIA_ROOTS.items():
+        root = root.resolve()
+        if root in path.parents:
+            break
+    else:
+        return None
+    if not start_server():
+        return None
+    url_path = "/" + prefix + "/" + quote(path.relative_to(root).as_posix())
+    expires = str(int(time.time()) + ttl)
+    query = urlencode({'exp': expires, 'sig': auth.sign_message(_signed_path(url_path, expires))})
+    return f"{MEDIA_SERVER_URL}{url_path}?{query}"
@@ -0,0 +1,105 @@
+"""
+ماژول نسخه‌های چندکیفیتی تصاویر
+Image Variants Module
+
+When an image is published, a background worker writes downscaled copies
+of it (480, 720 and 1080 pixels wide, as WebP and JPEG) next to it under
+``variants/``. Viewers pick the copy that matches their quality setting
+instead of downloading the original.
+"""
+
+import os
+import threading
+from pathlib import Path
+
+from PIL import Image, features
+
+from modules import background
+from modules import storage
+
+VARIANT_WIDTHS = (480, 720, 1080)
+
+# Student quality setting -> variant width (None = original file)
+QUALITY_WIDTHS = {'پایین': 480, 'متوسط': 720, 'بالا': 1080}
+
+WEBP_QUALITY = 75
+JPEG_QUALITY = 80
+
+def _formats():
+    return ('webp', 'jpeg') if features.check('webp') else ('jpeg',)
+
+def variant_path(source, width, fmt):
+    source = Path(source)
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return source.parent / "variants" / f"{source.stem}_{width}w.{ext}"
+
+def _is_stale(source, target):
+    source_version = storage.file_version(source)
+    target_version = storage.file_version(target)
+    return source_version is not None and (target_version is None or target_version[0] < source_version[0])
+
+def generate_variants(source):
+    """Write every missing or outdated variant of an image.
+
+    Widths larger than the original are not upscaled; they reuse the
+    original size. Returns the number of files written.
+    """
+    source = Path(source)
+    stale = [(w, fmt) for w in VARIANT_WIDTHS for fmt in _formats()
+             if _is_stale(source, variant_path(source, w, fmt))]
+    if not stale:
+        return 0
+
+    with Image.open(source) as original:
+        original.load()
+    written = 0
+    for width, fmt in stale:
+        image = original
+        if original.width > width:
+            height = max(1, round(original.height * width / original.width))
+            image = original.resize((width, height), Image.LANCZOS)
+        if fmt == 'jpeg':
+            image = image.convert('RGB')
+            options = {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+        else:
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            options = {'quality': WEBP_QUALITY, 'method': 4}
+
+        path = variant_path(source, width, fmt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        image.save(tmp_path, format=fmt.upper(), **options)
+        os.replace(tmp_path, path)
+        written += 1
+    return written
+
+_worker = background.KeyedWorker(generate_variants, "media-variants")
+
+def request_variants(source):
+    """Generate the variants of a published image in the background"""
+    _worker.request(str(source))
+
+def flush(timeout=None):
+    """Wait for requested variants to be written"""
+    return _worker.flush(timeout)
+
+def stats():
+    """Variant jobs completed and failed, with the last failure"""
+    return {'completed': _worker.completed, 'errors': _worker.errors, 'last_error': _worker.last_error}
+
+def pick_variant(source, quality):
+    """Path to show for a quality setting.
+
+    Falls back to the original (and queues the variants) while the matching
+    variant is missing or older than the image.
+    """
+    width = QUALITY_WIDTHS.get(quality)
+    if width is None:
+        return Path(source)
+    for fmt in _formats():
+        path = variant_path(source, width, fmt)
+        if not _is_stale(source, path):
+            return path
+    request_variants(source)
+    return Path(source)
@@ -0,0 +1,82 @@
+"""
+ماژول مدیریت مجوزها و وضعیت شرکت‌کنندگان
+Moderation State Module
+"""
+
+import threading
+from pathlib import Path
+
+from modules import storage
+
+MODERATION_FILE = Path("data/moderation.json")
+
+# Per-participant state is a single integer bitset
+MUTED = 1 << 0
+CAMERA_OFF = 1 << 1
+UNMUTE_ALLOWED = 1 << 2
+CAMERA_ALLOWED = 1 << 3
+CHAT_ALLOWED = 1 << 4
+SCREEN_SHARE_ALLOWED = 1 << 5
+WHITEBOARD_ALLOWED = 1 << 6
+BLOCKED = 1 << 7
+
+PERMISSION_MASK = UNMUTE_ALLOWED | CAMERA_ALLOWED | CHAT_ALLOWED | SCREEN_SHARE_ALLOWED | WHITEBOARD_ALLOWED
+DEFAULT_FLAGS = UNMUTE_ALLOWED | CAMERA_ALLOWED | CHAT_ALLOWED
+
+_write_lock = threading.Lock()
+
+def _empty_state():
+    return {'default': DEFAULT_FLAGS, 'flags': {}}
+
+def load_moderation(room_id):
+    """Return the moderation state of a room (shared, read-only)"""
+    all_state = storage.read_json_cached(MODERATION_FILE, {})
+    return all_state.get(room_id) or _empty_state()
+
+def get_flags(room_id, username):
+    """Return the flag bitset of a participant"""
+    state = load_moderation(room_id)
+    return state['flags'].get(username, state['default'])
+
+def is_allowed(room_id, username, flag):
+    """Check a single flag for a participant in O(1)"""
+    return bool(get_flags(room_id, username) & flag)
+
+def is_blocked(room_id, username):
+    """Check whether a user is on the room's block list"""
+    return is_allowed(room_id, username, BLOCKED)
+
+def blocked_users(room_id):
+    """Return the usernames blocked in a room"""
+    return [u for u, flags in load_moderation(room_id)['flags'].items() if flags & BLOCKED]
+
+def _apply_changes(room_id, changes, default=None):
+    with _write_lock:
+        all_state = dict(storage.read_json_cached(MODERATION_FILE, {}))
+        old_state = all_state.get(room_id) or _empty_state()
+        state = {'default': old_state['default'], 'flags': dict(old_state['flags'])}
+
+        base = state['default']
+        if default is not None:
+            state['default'] = default
+        for usernames, set_bits, clear_bits in changes:
+            for username in usernames:
+                flags = state['flags'].get(username, base)
+                state['flags'][username] = (flags | set_bits) & ~clear_bits
+
+        all_state[room_id] = state
+        storage.write_json_atomic(MODERATION_FILE, all_state)
+
+def update_flags(room_id, usernames, set_bits=0, clear_bits=0, default=None):
+    """Set and clear flags for many participants in a single write.
+
+    ``default`` replaces the flags used for participants without an entry
+    of their own, e.g. when the teacher saves room-wide permissions.
+    """
+    _apply_changes(room_id, [(usernames, set_bits, clear_bits)], default=default)
+
+def set_blocked(room_id, usernames):
+    """Replace the room's block list in a single write"""
+    usernames = set(usernames)
+    unblocked = [u for u in blocked_users(room_id) if u not in usernames]
+    _apply_changes(room_id, [(usernames, BLOCKED, 0), (unblocked, 0, BLOCKED)])
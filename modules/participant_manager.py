@@ -6,6 +6,9 @@ Participant Manager Module
 import streamlit as st
 from modules.classroom import load_rooms, save_room
 from modules.auth import load_users
+from modules import presence
+from modules import moderation
+from modules import waiting_room
 from datetime import datetime
 
 def show():
@@ -50,7 +53,8 @@ def show_teacher_participant_view(room):
         st.divider()
         
         # Participants list
-        st.markdown(f"### 👨‍🎓 دانش‌آموزان ({len(participants)} نفر)")
+        online = presence.online_users(room['id'])
+        st.markdown(f"### 👨‍🎓 دانش‌آموزان ({len(participants)} نفر، {len(online - {teacher})} آنلاین)")
         
         if participants:
             for idx, participant in enumerate(participants):
@@ -58,15 +62,30 @@ def show_teacher_participant_view(room):
                 col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
                 
                 with col1:
-                    st.write(f"**{user_info.get('full_name', participant)}** (@{participant})")
+                    status = "🟢" if participant in online else "⚪"
+                    st.write(f"{status} **{user_info.get('full_name', participant)}** (@{participant})")
+                
+                flags = moderation.get_flags(room['id'], participant)
                 
                 with col2:
-                    if st.button("🔇 قطع صدا", key=f"mute_{idx}"):
+                    if flags & moderation.MUTED:
+                        if st.button("🔊 وصل صدا", key=f"mute_{idx}"):
+                            moderation.update_flags(room['id'], [participant], clear_bits=moderation.MUTED)
+                            st.rerun()
+                    elif st.button("🔇 قطع صدا", key=f"mute_{idx}"):
+                        moderation.update_flags(room['id'], [participant], set_bits=moderation.MUTED)
                         st.success(f"صدای {participant} قطع شد")
+                        st.rerun()
                 
                 with col3:
-                    if st.button("📹 قطع دوربین", key=f"cam_{idx}"):
+                    if flags & moderation.CAMERA_OFF:
+                        if st.button("📹 وصل دوربین", key=f"cam_{idx}"):
+                            moderation.update_flags(room['id'], [participant], clear_bits=moderation.CAMERA_OFF)
+                            st.rerun()
+                    elif st.button("📹 قطع دوربین", key=f"cam_{idx}"):
+                        moderation.update_flags(room['id'], [participant], set_bits=moderation.CAMERA_OFF)
                         st.success(f"دوربین {participant} قطع شد")
+                        st.rerun()
                 
                 with col4:
                     if st.button("🚫 اخراج", key=f"kick_{idx}"):
@@ -80,18 +99,21 @@ def show_teacher_participant_view(room):
         else:
             st.info("هنوز کسی به کلاس نپیوسته است")
         
-        # Bulk actions
+        # Bulk actions (each is a single write of the moderation state)
         st.subheader("عملیات گروهی")
         col1, col2, col3 = st.columns(3)
         
         with col1:
             if st.button("🔇 قطع صدای همه"):
+                moderation.update_flags(room['id'], participants, set_bits=moderation.MUTED)
                 st.success("صدای همه قطع شد")
         with col2:
             if st.button("🔊 روشن صدای همه"):
+                moderation.update_flags(room['id'], participants, clear_bits=moderation.MUTED)
                 st.success("صدای همه روشن شد")
         with col3:
             if st.button("📹 قطع دوربین همه"):
+                moderation.update_flags(room['id'], participants, set_bits=moderation.CAMERA_OFF)
                 st.success("دوربین همه قطع شد")
     
     with tab2:
@@ -121,28 +143,80 @@ def show_teacher_participant_view(room):
         
         st.write("### مجوزهای عمومی")
         
-        allow_unmute = st.checkbox("اجازه روشن کردن میکروفون", value=True)
-        allow_camera = st.checkbox("اجازه روشن کردن دوربین", value=True)
-        allow_chat = st.checkbox("اجازه استفاده از چت", value=True)
-        allow_screen_share = st.checkbox("اجازه اشتراک صفحه", value=False)
-        allow_whiteboard = st.checkbox("اجازه استفاده از تخته سفید", value=False)
+        defaults = moderation.load_moderation(room['id'])['default']
+        permission_checkboxes = [
+            (moderation.UNMUTE_ALLOWED, "اجازه روشن کردن میکروفون"),
+            (moderation.CAMERA_ALLOWED, "اجازه روشن کردن دوربین"),
+            (moderation.CHAT_ALLOWED, "اجازه استفاده از چت"),
+            (moderation.SCREEN_SHARE_ALLOWED, "اجازه اشتراک صفحه"),
+            (moderation.WHITEBOARD_ALLOWED, "اجازه استفاده از تخته سفید"),
+        ]
+        allowed_bits = 0
+        for flag, label in permission_checkboxes:
+            if st.checkbox(label, value=bool(defaults & flag), key=f"perm_{flag}"):
+                allowed_bits |= flag
         
         if st.button("ذخیره تنظیمات"):
+            moderation.update_flags(
+                room['id'], participants,
+                set_bits=allowed_bits,
+                clear_bits=moderation.PERMISSION_MASK & ~allowed_bits,
+                default=(defaults & ~moderation.PERMISSION_MASK) | allowed_bits,
+            )
             st.success("تنظیمات ذخیره شد")
         
         st.divider()
         
         st.write("### لیست سیاه")
-        blocked_users = st.multiselect("کاربران مسدود شده:", [])
+        currently_blocked = moderation.blocked_users(room['id'])
+        blocked_users = st.multiselect(
+            "کاربران مسدود شده:",
+            sorted(set(participants) | set(currently_blocked)),
+            default=currently_blocked,
+        )
+        if st.button("ذخیره لیست سیاه"):
+            moderation.set_blocked(room['id'], blocked_users)
+            st.success("لیست سیاه ذخیره شد")
         
         st.write("### لیست انتظار")
-        waiting_users = st.multiselect("کاربران در انتظار تأیید:", [])
+        queue = waiting_room.waiting_list(room['id'])
+        if not room.get('waiting_room'):
+            st.caption("اتاق انتظار برای این کلاس فعال نیست")
+        names = {entry['username']: entry['full_name'] for entry in queue}
+        waiting_users = st.multiselect(
+            f"کاربران در انتظار تأیید ({len(queue)} نفر):",
+            list(names),
+            format_func=lambda u: f"{names.get(u, u)} (@{u})",
+        )
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("✅ تأیید انتخاب‌شده‌ها", disabled=not waiting_users):
+                waiting_room.decide(room['id'], waiting_users, approve=True)
+                st.success(f"{len(waiting_users)} نفر تأیید شدند")
+                st.rerun()
+        with col2:
+            if st.button("❌ رد انتخاب‌شده‌ها", disabled=not waiting_users):
+                waiting_room.decide(room['id'], waiting_users, approve=False)
+                st.warning(f"درخواست {len(waiting_users)} نفر رد شد")
+                st.rerun()
+        with col3:
+            if st.button("✅ تأیید همه", disabled=not queue):
+                waiting_room.decide(room['id'], list(names), approve=True)
+                st.success(f"{len(queue)} نفر تأیید شدند")
+                st.rerun()
 
 def show_student_participant_view(room):
     """Show student's participant view"""
     
     st.subheader("لیست شرکت‌کنندگان")
     
+    my_flags = moderation.get_flags(room['id'], st.session_state.username)
+    if my_flags & moderation.MUTED:
+        st.warning("🔇 صدای شما توسط مدرس قطع شده است")
+    if my_flags & moderation.CAMERA_OFF:
+        st.warning("📹 دوربین شما توسط مدرس قطع شده است")
+    
     participants = room['participants']
     teacher = room['teacher']
     
@@ -154,8 +228,10 @@ def show_student_participant_view(room):
     
     st.divider()
     
-    # Participants list
-    st.markdown(f"### 👨‍🎓 دانش‌آموزان ({len(participants)} نفر)")
+    # Participants list (online first)
+    online = presence.online_users(room['id'])
+    participants = sorted(participants, key=lambda p: p not in online)
+    st.markdown(f"### 👨‍🎓 دانش‌آموزان ({len(online - {teacher})} آنلاین از {len(participants)} نفر)")
     
     if participants:
         for participant in participants:
@@ -165,8 +241,11 @@ def show_student_participant_view(room):
             with col1:
                 st.write(f"**{user_info.get('full_name', participant)}**")
             with col2:
-                # Online status indicator
-                st.markdown("🟢 آنلاین")
+                # Online status indicator from live heartbeats
+                if participant in online:
+                    st.markdown("🟢 آنلاین")
+                else:
+                    st.markdown(presence.format_last_seen(presence.last_seen(room['id'], participant)))
             
             st.divider()
     else:
@@ -7,9 +7,19 @@ import streamlit as st
 import json
 from pathlib import Path
 from datetime import datetime
+from modules import poll_tally
+from modules import storage
+from modules import vote_log
+from modules import poll_deadlines
 
 POLLS_FILE = Path("data/polls.json")
 
+# Refresh interval of the teacher's live results panel
+LIVE_RESULTS_INTERVAL = 3  # seconds
+
+# Fields owned by the vote aggregator; poll edits never overwrite them
+VOTE_FIELDS = ('responses', 'response_times', 'counts', 'version')
+
 def init_polls_db():
     """Initialize polls database"""
     POLLS_FILE.parent.mkdir(exist_ok=True)
@@ -24,34 +34,137 @@ def load_polls(room_id):
         all_polls = json.load(f)
     return all_polls.get(room_id, [])
 
+def load_all_polls():
+    """Load polls of every room"""
+    init_polls_db()
+    with open(POLLS_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 def save_poll(room_id, poll_data):
     """Save poll to database"""
     init_polls_db()
-    with open(POLLS_FILE, 'r', encoding='utf-8') as f:
-        all_polls = json.load(f)
-    
-    if room_id not in all_polls:
-        all_polls[room_id] = []
-    
-    all_polls[room_id].append(poll_data)
-    
-    with open(POLLS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(all_polls, f, ensure_ascii=False, indent=2)
+    with vote_log.polls_lock(POLLS_FILE):
+        with open(POLLS_FILE, 'r', encoding='utf-8') as f:
+            all_polls = json.load(f)
+        
+        if room_id not in all_polls:
+            all_polls[room_id] = []
+        
+        all_polls[room_id].append(poll_data)
+        
+        storage.write_json_atomic(POLLS_FILE, all_polls)
+    poll_deadlines.schedule(room_id, poll_data)
 
 def update_poll(room_id, poll_id, updated_poll):
-    """Update poll in database"""
+    """Update poll in database (vote data on disk is kept as is)"""
     init_polls_db()
-    with open(POLLS_FILE, 'r', encoding='utf-8') as f:
-        all_polls = json.load(f)
-    
-    if room_id in all_polls:
-        for idx, poll in enumerate(all_polls[room_id]):
-            if poll['id'] == poll_id:
-                all_polls[room_id][idx] = updated_poll
-                break
+    with vote_log.polls_lock(POLLS_FILE):
+        with open(POLLS_FILE, 'r', encoding='utf-8') as f:
+            all_polls = json.load(f)
+        
+        if room_id in all_polls:
+            for idx, poll in enumerate(all_polls[room_id]):
+                if poll['id'] == poll_id:
+                    merged = dict(updated_poll)
+                    for field in VOTE_FIELDS:
+                        if field in poll:
+                            merged[field] = poll[field]
+                    all_polls[room_id][idx] = merged
+                    break
+        
+        storage.write_json_atomic(POLLS_FILE, all_polls)
+
+def delete_poll(room_id, poll_id):
+    """Delete a poll from database"""
+    init_polls_db()
+    with vote_log.polls_lock(POLLS_FILE):
+        with open(POLLS_FILE, 'r', encoding='utf-8') as f:
+            all_polls = json.load(f)
+        
+        all_polls[room_id] = [p for p in all_polls.get(room_id, []) if p['id'] != poll_id]
+        
+        storage.write_json_atomic(POLLS_FILE, all_polls)
+
+def record_vote(room_id, poll, username, indices):
+    """Append a vote to the room's vote log and fold pending votes in.
+
+    Folding is skipped if another session is already aggregating; that run
+    picks this vote up. Returns False if the poll's deadline has passed.
+    """
+    entry = vote_log.append_vote(room_id, poll['id'], username, indices,
+                                 deadline=poll_deadlines.poll_deadline(poll))
+    if entry is None:
+        return False
+    vote_log.aggregate(room_id, POLLS_FILE, blocking=False)
+    st.session_state.setdefault('voted_polls', set()).add(poll['id'])
+    return True
+
+def show_remaining_time(poll):
+    """Show the time left before the poll closes, from the loaded poll only"""
+    remaining = poll_deadlines.remaining_seconds(poll)
+    if remaining is None or poll['status'] != 'active':
+        return
+    if remaining > 0:
+        st.info(f"⏰ زمان باقی‌مانده: {poll_deadlines.format_remaining(remaining)}")
+    else:
+        st.warning("⏰ مهلت پاسخ به پایان رسیده است")
+
+def render_results(poll):
+    """Render poll results from the running tallies"""
+    for option, count, percentage in poll_tally.results(poll):
+        st.progress(percentage / 100)
+        st.write(f"{option}: {count} رأی ({percentage:.1f}%)")
+
+def _live_poll(room_id, poll_id):
+    """Return the latest state of a poll, re-reading the store only on change.
+
+    A stat of the vote log and polls.json decides whether anything changed;
+    the poll is kept in session state together with that token and its
+    vote version.
+    """
+    cache_key = f"live_poll_{poll_id}"
+    token = (vote_log.log_version(room_id), storage.file_version(POLLS_FILE))
+    cached = st.session_state.get(cache_key)
+    if cached is not None and cached[0] == token:
+        return cached[1]
     
-    with open(POLLS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(all_polls, f, ensure_ascii=False, indent=2)
+    if vote_log.aggregate(room_id, POLLS_FILE, blocking=False):
+        token = (vote_log.log_version(room_id), storage.file_version(POLLS_FILE))
+    polls = storage.read_json_cached(POLLS_FILE, {}).get(room_id, [])
+    poll = next((p for p in polls if p['id'] == poll_id), None)
+    if cached is not None and poll is not None and poll.get('version') == cached[1].get('version'):
+        poll = cached[1]
+    st.session_state[cache_key] = (token, poll)
+    return poll
+
+def show_live_results(room_id, poll_id):
+    """Results panel of an active poll, refreshed on its own on an interval"""
+    fragment = getattr(st, "fragment", None)
+    if fragment is not None:
+        fragment(run_every=LIVE_RESULTS_INTERVAL)(live_results_panel)(room_id, poll_id)
+    else:
+        live_results_panel(room_id, poll_id)
+
+def live_results_panel(room_id, poll_id):
+    """Draw an active poll's results; each tick reruns only this panel.
+
+    The store is re-read only when the change token moved (see _live_poll).
+    Due deadlines are closed here too (a heap peek when none are due), so a
+    poll does not stay open while everyone watches its results.
+    """
+    poll_deadlines.close_due(POLLS_FILE)
+    poll = _live_poll(room_id, poll_id)
+    if poll is None:
+        return
+    if poll['status'] != 'active':
+        # Closed meanwhile: the page's poll controls depend on the status
+        st.rerun()
+    st.write(f"**تعداد پاسخ‌ها:** {len(poll['responses'])}")
+    show_remaining_time(poll)
+    if poll['responses']:
+        st.write("### نتایج:")
+        render_results(poll)
+    st.caption(f"🔄 به‌روزرسانی خودکار هر {LIVE_RESULTS_INTERVAL} ثانیه")
 
 def show():
     """Show poll interface"""
@@ -63,6 +176,12 @@ def show():
     
     st.info(f"کلاس فعال: {st.session_state.room_id}")
     
+    # Fold votes logged since the last render into the polls file, then
+    # close polls whose deadline has passed
+    vote_log.aggregate(st.session_state.room_id, POLLS_FILE)
+    poll_deadlines.seed(st.session_state.room_id, load_polls)
+    poll_deadlines.close_due(POLLS_FILE)
+    
     if st.session_state.user_role == "مدرس":
         show_teacher_poll_view()
     else:
@@ -71,7 +190,13 @@ def show():
 def show_teacher_poll_view():
     """Show teacher's poll creation and management view"""
     
-    tab1, tab2 = st.tabs(["ایجاد نظرسنجی", "مدیریت نظرسنجی‌ها"])
+    tab1, tab2, tab3, tab4 = st.tabs(["ایجاد نظرسنجی", "مدیریت نظرسنجی‌ها", "نمرات", "تحلیل و خروجی"])
+    
+    with tab3:
+        show_gradebook()
+    
+    with tab4:
+        show_analytics()
     
     with tab1:
         st.subheader("ایجاد نظرسنجی جدید")
@@ -84,6 +209,7 @@ def show_teacher_poll_view():
         
         options = []
         correct_answer = None
+        correct_answers = []
         
         for i in range(num_options):
             col1, col2 = st.columns([4, 1])
@@ -95,6 +221,7 @@ def show_teacher_poll_view():
                 if poll_type == "کوئیز":
                     if st.checkbox("صحیح", key=f"correct_{i}"):
                         correct_answer = i
+                        correct_answers.append(i)
         
         col1, col2 = st.columns(2)
         with col1:
@@ -106,18 +233,23 @@ def show_teacher_poll_view():
         
         if st.button("ایجاد نظرسنجی", type="primary"):
             if poll_question and all(options):
+                created_at = datetime.now().isoformat()
                 poll_data = {
                     'id': f"poll_{datetime.now().strftime('%Y%m%d%H%M%S')}",
                     'type': poll_type,
                     'question': poll_question,
                     'options': options,
                     'correct_answer': correct_answer,
+                    'correct_answers': correct_answers,
                     'allow_multiple': allow_multiple,
                     'show_results': show_results,
                     'time_limit': time_limit,
-                    'created_at': datetime.now().isoformat(),
+                    'created_at': created_at,
+                    'deadline': poll_deadlines.compute_deadline(created_at, time_limit),
                     'created_by': st.session_state.username,
                     'responses': {},
+                    'counts': [0] * len(options),
+                    'version': 0,
                     'status': 'active'
                 }
                 save_poll(st.session_state.room_id, poll_data)
@@ -139,51 +271,166 @@ def show_teacher_poll_view():
             with st.expander(f"📋 {poll['question']}"):
                 st.write(f"**نوع:** {poll['type']}")
                 st.write(f"**وضعیت:** {poll['status']}")
-                st.write(f"**تعداد پاسخ‌ها:** {len(poll['responses'])}")
-                
-                # Show results
-                if poll['responses']:
-                    st.write("### نتایج:")
-                    
-                    # Count votes for each option
-                    vote_counts = {}
-                    for option in poll['options']:
-                        vote_counts[option] = 0
-                    
-                    for user, response in poll['responses'].items():
-                        if isinstance(response, list):
-                            for r in response:
-                                if r in vote_counts:
-                                    vote_counts[r] += 1
-                        else:
-                            if response in vote_counts:
-                                vote_counts[response] += 1
-                    
-                    # Display results
-                    total_votes = sum(vote_counts.values())
-                    for option, count in vote_counts.items():
-                        percentage = (count / total_votes * 100) if total_votes > 0 else 0
-                        st.progress(percentage / 100)
-                        st.write(f"{option}: {count} رأی ({percentage:.1f}%)")
+                # Show results (active polls refresh themselves while open)
+                if poll['status'] == 'active':
+                    show_live_results(st.session_state.room_id, poll['id'])
+                else:
+                    st.write(f"**تعداد پاسخ‌ها:** {len(poll['responses'])}")
+                    if poll['responses']:
+                        st.write("### نتایج:")
+                        render_results(poll)
                 
                 # Poll controls
-                col1, col2 = st.columns(2)
+                col1, col2, col3 = st.columns(3)
                 with col1:
                     if poll['status'] == 'active':
                         if st.button("پایان نظرسنجی", key=f"end_{poll['id']}"):
                             poll['status'] = 'closed'
+                            poll['closed_at'] = datetime.now().isoformat()
                             update_poll(st.session_state.room_id, poll['id'], poll)
                             st.success("نظرسنجی بسته شد")
                             st.rerun()
                 with col2:
+                    if st.button("بررسی شمارش", key=f"reconcile_{poll['id']}"):
+                        if vote_log.reconcile(st.session_state.room_id, poll['id'], POLLS_FILE):
+                            st.warning("شمارش آرا اصلاح شد")
+                        else:
+                            st.success("شمارش آرا با پاسخ‌ها مطابقت دارد")
+                with col3:
                     if st.button("حذف", key=f"delete_{poll['id']}"):
-                        polls = [p for p in polls if p['id'] != poll['id']]
-                        with open(POLLS_FILE, 'w', encoding='utf-8') as f:
-                            json.dump({st.session_state.room_id: polls}, f, 
-                                    ensure_ascii=False, indent=2)
+                        delete_poll(st.session_state.room_id, poll['id'])
                         st.success("نظرسنجی حذف شد")
                         st.rerun()
 
+def show_gradebook():
+    """Show quiz scores of this class and the gradebook of its course"""
+    from modules import grading
+    from modules.classroom import load_rooms
+    
+    st.subheader("نمرات کوئیزها")
+    
+    rooms = load_rooms()
+    room = rooms.get(st.session_state.room_id)
+    all_polls = load_all_polls()
+    quizzes = [p for p in all_polls.get(st.session_state.room_id, []) if grading.is_gradable(p)]
+    
+    if not quizzes:
+        st.info("هنوز کوئیزی با پاسخ صحیح در این کلاس ایجاد نشده است")
+    else:
+        quiz = st.selectbox("کوئیز:", quizzes, format_func=lambda p: p['question'])
+        usernames, scores = grading.grade_quiz(quiz)
+        if usernames:
+            st.write(f"میانگین نمره: {scores.mean() * 100:.1f}%")
+            st.dataframe({
+                "دانش‌آموز": usernames,
+                "نمره (%)": (scores * 100).round(1),
+            }, use_container_width=True)
+        else:
+            st.info("هنوز پاسخی ثبت نشده است")
+    
+    if not room:
+        return
+    
+    st.divider()
+    course = grading.room_course(room)
+    st.subheader(f"کارنامه درس: {course}")
+    course_quizzes = grading.course_quizzes(rooms, all_polls, course, teacher=room['teacher'])
+    students, quiz_ids, matrix, totals = grading.build_gradebook(course_quizzes)
+    
+    if not students:
+        st.info("هنوز نمره‌ای برای این درس ثبت نشده است")
+        return
+    
+    table = {"دانش‌آموز": students}
+    for col, quiz in enumerate(course_quizzes):
+        table[f"{col + 1}. {quiz['question']}"] = (matrix[:, col] * 100).round(1)
+    table["میانگین کل (%)"] = totals.round(1)
+    st.write(f"{len(course_quizzes)} کوئیز، {len(students)} دانش‌آموز")
+    st.dataframe(table, use_container_width=True)
+
+def show_analytics():
+    """Show poll aggregates and bulk exports for this class and its course"""
+    from modules import grading
+    from modules import poll_analytics
+    from modules import presence
+    from modules.classroom import load_rooms
+    
+    st.subheader("تحلیل نظرسنجی‌ها")
+    
+    rooms = load_rooms()
+    room = rooms.get(st.session_state.room_id)
+    all_polls = load_all_polls()
+    polls = all_polls.get(st.session_state.room_id, [])
+    
+    if not polls:
+        st.info("هنوز نظرسنجی ایجاد نشده است")
+        return
+    
+    poll = st.selectbox("نظرسنجی:", polls, format_func=lambda p: p['question'], key="analytics_poll")
+    # Eligible voters: students online now plus everyone who already answered
+    teacher = room.get('teacher') if room else None
+    eligible = (presence.online_users(st.session_state.room_id) - {teacher}) | set(poll['responses'])
+    room_size = len(eligible)
+    summary = poll_analytics.poll_summary(poll, room_size)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("تعداد پاسخ", summary['responded'])
+    with col2:
+        st.metric("نرخ مشارکت", f"{summary['participation'] * 100:.0f}%")
+    with col3:
+        if summary['median_delay'] is not None:
+            st.metric("میانه زمان پاسخ", f"{summary['median_delay']:.0f} ثانیه")
+    
+    st.write("### توزیع پاسخ‌ها")
+    st.bar_chart({"تعداد": {opt: int(n) for opt, n in zip(poll['options'], summary['distribution'])}})
+    
+    if summary['delay_hist'].size:
+        st.write("### هیستوگرام زمان پاسخ (ثانیه)")
+        edges = summary['delay_edges']
+        st.bar_chart({"تعداد": {
+            f"{edges[i]:.0f}-{edges[i + 1]:.0f}": int(n) for i, n in enumerate(summary['delay_hist'])
+        }})
+    
+    others = [p for p in polls if p['id'] != poll['id']]
+    if others:
+        st.write("### جدول متقاطع")
+        other = st.selectbox("مقایسه با:", others, format_func=lambda p: p['question'], key="analytics_crosstab")
+        table = poll_analytics.crosstab(poll, other)
+        st.dataframe({
+            poll['question']: poll['options'],
+            **{opt: table[:, j] for j, opt in enumerate(other['options'])},
+        }, use_container_width=True)
+    
+    st.divider()
+    st.write("### خروجی پاسخ‌ها")
+    # Exports are built when requested, not on every render
+    exports = [('room', "این کلاس", st.session_state.room_id, {st.session_state.room_id: polls})]
+    if room:
+        course = grading.room_course(room)
+        course_polls = {
+            rid: all_polls.get(rid, []) for rid, r in rooms.items()
+            if grading.room_course(r) == course and r.get('teacher') == room['teacher']
+        }
+        exports.append(('course', "کل درس", course, course_polls))
+    
+    for col, (scope, label, name, scope_polls) in zip(st.columns(2), exports):
+        with col:
+            state_key = f"analytics_export_{scope}_{st.session_state.room_id}"
+            if st.button(f"📦 آماده‌سازی خروجی {label}", key=f"build_{state_key}"):
+                st.session_state[state_key] = {
+                    'csv': "".join(poll_analytics.iter_csv(scope_polls)),
+                    'json': "".join(poll_analytics.iter_json(scope_polls)),
+                    'built_at': datetime.now().strftime("%H:%M:%S"),
+                }
+            built = st.session_state.get(state_key)
+            if built:
+                st.download_button(f"⬇️ CSV {label}", built['csv'],
+                                   file_name=f"{name}_polls.csv", mime="text/csv")
+                st.download_button(f"⬇️ JSON {label}", built['json'],
+                                   file_name=f"{name}_polls.json", mime="application/json")
+                st.caption(f"ساخته‌شده در {built['built_at']}")
+
 def show_student_poll_view():
     """Show student's poll participation view"""
     
@@ -201,58 +448,48 @@ def show_student_poll_view():
             st.write(f"**نوع:** {poll['type']}")
             
             # Check if user already responded
-            user_responded = st.session_state.username in poll['responses']
+            user_responded = (st.session_state.username in poll['responses'] or
+                              poll['id'] in st.session_state.get('voted_polls', ()))
             
-            if user_responded:
-                st.success("✅ شما به این نظرسنجی پاسخ داده‌اید")
+            expired = poll_deadlines.remaining_seconds(poll) == 0
+            
+            if user_responded or expired:
+                if user_responded:
+                    st.success("✅ شما به این نظرسنجی پاسخ داده‌اید")
+                else:
+                    st.warning("⏰ مهلت پاسخ به این نظرسنجی به پایان رسیده است")
                 
                 if poll['show_results']:
                     st.write("### نتایج:")
-                    vote_counts = {}
-                    for option in poll['options']:
-                        vote_counts[option] = 0
-                    
-                    for user, response in poll['responses'].items():
-                        if isinstance(response, list):
-                            for r in response:
-                                if r in vote_counts:
-                                    vote_counts[r] += 1
-                        else:
-                            if response in vote_counts:
-                                vote_counts[response] += 1
-                    
-                    total_votes = sum(vote_counts.values())
-                    for option, count in vote_counts.items():
-                        percentage = (count / total_votes * 100) if total_votes > 0 else 0
-                        st.progress(percentage / 100)
-                        st.write(f"{option}: {count} رأی ({percentage:.1f}%)")
+                    render_results(poll)
             else:
                 # Show options for voting
                 if poll['allow_multiple']:
                     selected = []
-                    for option in poll['options']:
-                        if st.checkbox(option, key=f"{poll['id']}_{option}"):
-                            selected.append(option)
+                    for idx, option in enumerate(poll['options']):
+                        if st.checkbox(option, key=f"{poll['id']}_{idx}"):
+                            selected.append(idx)
                     
                     if st.button("ثبت پاسخ", key=f"submit_{poll['id']}"):
-                        if selected:
-                            poll['responses'][st.session_state.username] = selected
-                            update_poll(st.session_state.room_id, poll['id'], poll)
+                        if not selected:
+                            st.warning("لطفاً حداقل یک گزینه انتخاب کنید")
+                        elif record_vote(st.session_state.room_id, poll, st.session_state.username, selected):
                             st.success("پاسخ شما ثبت شد!")
                             st.rerun()
                         else:
-                            st.warning("لطفاً حداقل یک گزینه انتخاب کنید")
+                            st.error("مهلت پاسخ به پایان رسیده است")
                 else:
                     selected = st.radio("گزینه خود را انتخاب کنید:", 
-                                      poll['options'], 
+                                      range(len(poll['options'])), 
+                                      format_func=lambda i: poll['options'][i],
                                       key=f"radio_{poll['id']}")
                     
                     if st.button("ثبت پاسخ", key=f"submit_{poll['id']}"):
-                        poll['responses'][st.session_state.username] = selected
-                        update_poll(st.session_state.room_id, poll['id'], poll)
-                        st.success("پاسخ شما ثبت شد!")
-                        st.rerun()
+                        if record_vote(st.session_state.room_id, poll, st.session_state.username, [selected]):
+                            st.success("پاسخ شما ثبت شد!")
+                            st.rerun()
+                        else:
+                            st.error("مهلت پاسخ به پایان رسیده است")
                 
                 # Show time remaining
-                if poll['time_limit'] > 0:
-                    st.info(f"⏰ مهلت پاسخ: {poll['time_limit']} دقیقه")
\ No newline at end of file
+                show_remaining_time(poll)
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+ماژول تحلیل نظرسنجی‌ها
+Poll Analytics Module
+"""
+
+import csv
+import io
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from modules import poll_tally
+
+# Aggregates kept for recently viewed polls, least recently used dropped first
+MAX_CACHED = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _created_ts(poll):
+    return datetime.fromisoformat(poll['created_at']).timestamp()
+
+def poll_columns(poll):
+    """Columnar view of a poll's responses.
+
+    Returns a dict of parallel arrays: ``users``, ``choice`` (first selected
+    option, -1 if none), ``selections`` (users x options bool matrix) and
+    ``delay`` (seconds from poll creation to the vote, NaN if unknown).
+    """
+    users = list(poll['responses'])
+    selections = np.zeros((len(users), len(poll['options'])), dtype=bool)
+    choice = np.full(len(users), -1, dtype=np.intp)
+    delay = np.full(len(users), np.nan)
+    response_times = poll.get('response_times', {})
+    created = _created_ts(poll)
+
+    for row, user in enumerate(users):
+        indices = poll_tally.response_indices(poll, poll['responses'][user])
+        if indices:
+            selections[row, indices] = True
+            choice[row] = indices[0]
+        if user in response_times:
+            delay[row] = response_times[user] - created
+
+    return {'users': users, 'choice': choice, 'selections': selections, 'delay': delay}
+
+def _cached(key, version, compute):
+    """Return a cached aggregate while the poll's vote version is unchanged"""
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit:
+            _cache.move_to_end(key)
+    if hit and hit[0] == version:
+        return hit[1]
+    value = compute()
+    with _cache_lock:
+        _cache[key] = (version, value)
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHED:
+            _cache.popitem(last=False)
+    return value
+
+def poll_summary(poll, room_size, bins=10):
+    """Distribution, participation and response-time histogram of a poll.
+
+    Results are cached until the next vote bumps the poll's version.
+    """
+    def compute():
+        cols = poll_columns(poll)
+        distribution = cols['selections'].sum(axis=0)
+        delays = cols['delay'][np.isfinite(cols['delay'])]
+        if delays.size:
+            hist, edges = np.histogram(delays, bins=bins)
+        else:
+            hist, edges = np.zeros(0, dtype=int), np.zeros(0)
+        responded = len(cols['users'])
+        return {
+            'distribution': distribution,
+            'share': distribution / max(responded, 1),
+            'responded': responded,
+            'room_size': room_size,
+            'participation': responded / room_size if room_size else 0.0,
+            'delay_hist': hist,
+            'delay_edges': edges,
+            'median_delay': float(np.median(delays)) if delays.size else None,
+        }
+
+    key = ('summary', poll['id'], poll['created_at'], room_size, bins)
+    return _cached(key, poll.get('version', 0), compute)
+
+def crosstab(poll_a, poll_b):
+    """Counts of (choice in A, choice in B) over users who answered both"""
+    def compute():
+        a = poll_columns(poll_a)
+        b = poll_columns(poll_b)
+        b_choice = dict(zip(b['users'], b['choice']))
+        pairs = np.array(
+            [(ca, b_choice[u]) for u, ca in zip(a['users'], a['choice'])
+             if u in b_choice and ca >= 0 and b_choice[u] >= 0],
+            dtype=np.intp,
+        ).reshape(-1, 2)
+        table = np.zeros((len(poll_a['options']), len(poll_b['options'])), dtype=int)
+        np.add.at(table, (pairs[:, 0], pairs[:, 1]), 1)
+        return table
+
+    key = ('crosstab', poll_a['id'], poll_a['created_at'], poll_b['id'], poll_b['created_at'])
+    return _cached(key, (poll_a.get('version', 0), poll_b.get('version', 0)), compute)
+
+EXPORT_FIELDS = ['room_id', 'poll_id', 'question', 'type', 'username', 'options', 'responded_at']
+
+def _export_rows(polls_by_room):
+    for room_id, polls in polls_by_room.items():
+        for poll in polls:
+            response_times = poll.get('response_times', {})
+            for user, response in poll['responses'].items():
+                indices = poll_tally.response_indices(poll, response)
+                ts = response_times.get(user)
+                yield {
+                    'room_id': room_id,
+                    'poll_id': poll['id'],
+                    'question': poll['question'],
+                    'type': poll.get('type', ''),
+                    'username': user,
+                    'options': [poll['options'][i] for i in indices],
+                    'responded_at': datetime.fromtimestamp(ts).isoformat() if ts else None,
+                }
+
+def iter_csv(polls_by_room):
+    """Stream all responses of the given rooms' polls as CSV text chunks"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in _export_rows(polls_by_room):
+        row['options'] = ";".join(row['options'])
+        writer.writerow(row)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_json(polls_by_room):
+    """Stream all responses of the given rooms' polls as a JSON array"""
+    yield "["
+    for idx, row in enumerate(_export_rows(polls_by_room)):
+        yield ("," if idx else "") + json.dumps(row, ensure_ascii=False)
+    yield "]"
@@ -0,0 +1,116 @@
+"""
+ماژول مهلت نظرسنجی‌ها
+Poll Deadline Module
+
+Active polls with a time limit are kept in a process-wide min-heap ordered
+by deadline, so finding the polls to close is a peek at the heap top
+instead of a scan over every poll on every render.
+"""
+
+import heapq
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from modules import storage
+from modules import vote_log
+
+def compute_deadline(created_at, time_limit):
+    """Return the ISO deadline for a poll, or None if it has no time limit"""
+    if not time_limit:
+        return None
+    return (datetime.fromisoformat(created_at) + timedelta(minutes=time_limit)).isoformat()
+
+def poll_deadline(poll):
+    """Return the poll's deadline as a Unix timestamp, or None"""
+    deadline = poll.get('deadline') or compute_deadline(poll['created_at'], poll.get('time_limit'))
+    if not deadline:
+        return None
+    return datetime.fromisoformat(deadline).timestamp()
+
+def remaining_seconds(poll, now=None):
+    """Seconds left before the poll closes, or None if it has no deadline"""
+    deadline = poll_deadline(poll)
+    if deadline is None:
+        return None
+    return max(0, deadline - (time.time() if now is None else now))
+
+def format_remaining(seconds):
+    """Format remaining seconds as mm:ss"""
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes:02d}:{secs:02d}"
+
+class DeadlineTimer:
+    """Min-heap of (deadline, room_id, poll_id) for active polls"""
+
+    def __init__(self):
+        self._heap = []
+        self._scheduled = set()
+        self._seeded_rooms = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, room_id, poll):
+        deadline = poll_deadline(poll)
+        if deadline is None or poll.get('status') != 'active':
+            return
+        key = (room_id, poll['id'])
+        with self._lock:
+            if key not in self._scheduled:
+                self._scheduled.add(key)
+                heapq.heappush(self._heap, (deadline, room_id, poll['id']))
+
+    def seed(self, room_id, load_polls):
+        """Schedule a room's existing polls the first time the room is seen"""
+        with self._lock:
+            if room_id in self._seeded_rooms:
+                return
+            self._seeded_rooms.add(room_id)
+        for poll in load_polls(room_id):
+            self.schedule(room_id, poll)
+
+    def pop_due(self, now=None):
+        """Remove and return (deadline, room_id, poll_id) for every expired poll"""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, room_id, poll_id = heapq.heappop(self._heap)
+                self._scheduled.discard((room_id, poll_id))
+                due.append((deadline, room_id, poll_id))
+        return due
+
+_timer = DeadlineTimer()
+
+def schedule(room_id, poll):
+    """Register a poll's deadline with the process-wide timer"""
+    _timer.schedule(room_id, poll)
+
+def seed(room_id, load_polls):
+    """Register the deadlines of a room's polls once per process"""
+    _timer.seed(room_id, load_polls)
+
+def close_due(polls_file, now=None):
+    """Close every poll whose deadline has passed, in a single write.
+
+    Returns the number of polls closed.
+    """
+    due = _timer.pop_due(now)
+    if not due:
+        return 0
+
+    closing = {(room_id, poll_id): deadline for deadline, room_id, poll_id in due}
+    closed = 0
+    with vote_log.polls_lock(polls_file):
+        with open(polls_file, 'r', encoding='utf-8') as f:
+            all_polls = json.load(f)
+        for room_id in {room_id for room_id, _ in closing}:
+            for poll in all_polls.get(room_id, []):
+                deadline = closing.get((room_id, poll['id']))
+                if deadline is not None and poll['status'] == 'active':
+                    poll['status'] = 'closed'
+                    poll['closed_at'] = datetime.fromtimestamp(deadline).isoformat()
+                    closed += 1
+        if closed:
+            storage.write_json_atomic(polls_file, all_polls)
+    return closed
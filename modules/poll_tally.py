@@ -0,0 +1,81 @@
+"""
+ماژول شمارش آرای نظرسنجی
+Poll Tally Module
+"""
+
+def response_indices(poll, response):
+    """Return the option indices of a stored response.
+
+    Responses are stored as an option index (or a list of indices for
+    multi-select polls); older polls stored option text, which is mapped
+    back to its index here.
+    """
+    if response is None:
+        return []
+    items = response if isinstance(response, list) else [response]
+    indices = []
+    for item in items:
+        if isinstance(item, int):
+            idx = item
+        elif item in poll['options']:
+            idx = poll['options'].index(item)
+        else:
+            continue
+        if 0 <= idx < len(poll['options']) and idx not in indices:
+            indices.append(idx)
+    return indices
+
+def compute_counts(poll):
+    """Recount votes per option from the raw responses"""
+    counts = [0] * len(poll['options'])
+    for response in poll['responses'].values():
+        for idx in response_indices(poll, response):
+            counts[idx] += 1
+    return counts
+
+def reconcile_tallies(poll):
+    """Rebuild the running counters from the responses.
+
+    Returns True if the stored counters disagreed with the responses.
+    """
+    counts = compute_counts(poll)
+    drifted = poll.get('counts') != counts
+    poll['counts'] = counts
+    return drifted
+
+def ensure_tallies(poll):
+    """Backfill counters for polls created before tallies existed"""
+    if len(poll.get('counts') or []) != len(poll['options']):
+        reconcile_tallies(poll)
+        poll.setdefault('version', 0)
+    return poll
+
+def apply_vote(poll, username, indices):
+    """Record a user's vote and update the counters incrementally.
+
+    A repeated vote by the same user replaces the previous one, so the
+    counters always match one response per user.
+    """
+    indices = response_indices(poll, list(indices))
+    if not indices:
+        raise ValueError("a vote must select at least one valid option")
+
+    ensure_tallies(poll)
+    counts = poll['counts']
+    for idx in response_indices(poll, poll['responses'].get(username)):
+        counts[idx] -= 1
+    for idx in indices:
+        counts[idx] += 1
+
+    poll['responses'][username] = indices if poll.get('allow_multiple') else indices[0]
+    poll['version'] = poll.get('version', 0) + 1
+
+def results(poll):
+    """Return (option, count, percentage) rows in O(number of options)"""
+    ensure_tallies(poll)
+    counts = poll['counts']
+    total_votes = sum(counts)
+    return [
+        (option, count, (count / total_votes * 100) if total_votes > 0 else 0)
+        for option, count in zip(poll['options'], counts)
+    ]
@@ -0,0 +1,211 @@
+"""
+ماژول حضور آنلاین
+Presence Tracking Module
+"""
+
+import streamlit as st
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# A session counts as online for this long after its last heartbeat
+PRESENCE_TTL = 90  # seconds
+HEARTBEAT_INTERVAL = 30  # seconds
+
+# "memory" keeps presence in this process; "sqlite" shares it between processes
+PRESENCE_BACKEND = os.environ.get("PRESENCE_BACKEND", "memory")
+PRESENCE_DB = Path("data/presence.sqlite3")
+
+class MemoryPresence:
+    """In-process presence store with heap-ordered TTL expiry.
+
+    Every heartbeat pushes (expiry, room, user) onto a min-heap; stale heap
+    entries left behind by newer heartbeats are skipped when popped, so
+    evicting an expired entry costs O(log n).
+    """
+
+    def __init__(self, ttl=PRESENCE_TTL):
+        self.ttl = ttl
+        self._last_seen = {}  # room_id -> {username: timestamp}
+        self._expiry_heap = []
+        self._last_seen_offline = {}  # room_id -> {username: timestamp}
+        self._lock = threading.Lock()
+
+    def heartbeat(self, room_id, username, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._last_seen.setdefault(room_id, {})[username] = now
+            heapq.heappush(self._expiry_heap, (now + self.ttl, room_id, username))
+            self._evict(now)
+
+    def leave(self, room_id, username, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._last_seen.get(room_id, {}).pop(username, None) is not None:
+                self._last_seen_offline.setdefault(room_id, {})[username] = now
+
+    def online_users(self, room_id, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict(now)
+            return set(self._last_seen.get(room_id, {}))
+
+    def online_count(self, room_id, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict(now)
+            return len(self._last_seen.get(room_id, {}))
+
+    def last_seen(self, room_id, username):
+        with self._lock:
+            seen = self._last_seen.get(room_id, {}).get(username)
+            if seen is None:
+                seen = self._last_seen_offline.get(room_id, {}).get(username)
+            return seen
+
+    def _evict(self, now):
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expiry, room_id, username = heapq.heappop(heap)
+            room = self._last_seen.get(room_id)
+            if room is None or username not in room:
+                continue
+            # Skip entries superseded by a later heartbeat
+            if room[username] + self.ttl > expiry:
+                continue
+            self._last_seen_offline.setdefault(room_id, {})[username] = room.pop(username)
+
+class SqlitePresence:
+    """Presence shared between processes through a SQLite table.
+
+    Expiry uses an index on (online, last_seen), so marking stale rows
+    offline is an index range scan rather than a table scan.
+    """
+
+    def __init__(self, db_path=PRESENCE_DB, ttl=PRESENCE_TTL):
+        self.ttl = ttl
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS presence ("
+                "room_id TEXT NOT NULL, username TEXT NOT NULL, last_seen REAL NOT NULL, "
+                "online INTEGER NOT NULL DEFAULT 1, PRIMARY KEY (room_id, username))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS presence_expiry ON presence (online, last_seen)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def heartbeat(self, room_id, username, now=None):
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO presence (room_id, username, last_seen, online) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (room_id, username) DO UPDATE SET last_seen = excluded.last_seen, online = 1",
+                (room_id, username, now),
+            )
+            self._evict(conn, now)
+
+    def leave(self, room_id, username, now=None):
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE presence SET online = 0, last_seen = ? WHERE room_id = ? AND username = ?",
+                (now, room_id, username),
+            )
+
+    def online_users(self, room_id, now=None):
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            self._evict(conn, now)
+            rows = conn.execute(
+                "SELECT username FROM presence WHERE room_id = ? AND online = 1", (room_id,)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def online_count(self, room_id, now=None):
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            self._evict(conn, now)
+            row = conn.execute(
+                "SELECT COUNT(*) FROM presence WHERE room_id = ? AND online = 1", (room_id,)
+            ).fetchone()
+        return row[0]
+
+    def last_seen(self, room_id, username):
+        row = self._connect().execute(
+            "SELECT last_seen FROM presence WHERE room_id = ? AND username = ?", (room_id, username)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _evict(self, conn, now):
+        conn.execute("UPDATE presence SET online = 0 WHERE online = 1 AND last_seen <= ?", (now - self.ttl,))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Return the process-wide presence store for the configured backend"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SqlitePresence() if PRESENCE_BACKEND == "sqlite" else MemoryPresence()
+    return _store
+
+def heartbeat(room_id, username):
+    """Mark a user as online in a room"""
+    if room_id and username:
+        get_store().heartbeat(room_id, username)
+
+def leave(room_id, username):
+    """Mark a user as offline in a room right away"""
+    if room_id and username:
+        get_store().leave(room_id, username)
+
+def online_users(room_id):
+    """Return the set of users currently online in a room"""
+    return get_store().online_users(room_id)
+
+def online_count(room_id):
+    """Return the number of users currently online in a room"""
+    return get_store().online_count(room_id)
+
+def last_seen(room_id, username):
+    """Return the last heartbeat timestamp of a user, or None"""
+    return get_store().last_seen(room_id, username)
+
+def format_last_seen(timestamp, now=None):
+    """Human readable Persian label for a last-seen timestamp"""
+    if timestamp is None:
+        return "⚪ هرگز"
+    elapsed = int((time.time() if now is None else now) - timestamp)
+    if elapsed < 60:
+        return "⚪ لحظاتی پیش"
+    if elapsed < 3600:
+        return f"⚪ {elapsed // 60} دقیقه پیش"
+    return f"⚪ {elapsed // 3600} ساعت پیش"
+
+def render_heartbeat(room_id, username):
+    """Send a heartbeat now and keep sending one periodically while the page is open"""
+    heartbeat(room_id, username)
+
+    fragment = getattr(st, "fragment", None)
+    if fragment is None:
+        return
+
+    @fragment(run_every=HEARTBEAT_INTERVAL)
+    def _presence_heartbeat():
+        heartbeat(room_id, username)
+
+    _presence_heartbeat()
@@ -7,6 +7,8 @@ import streamlit as st
 import json
 from pathlib import Path
 from datetime import datetime, timedelta
+from modules import media_server
+from modules import storage
 
 RECORDINGS_FILE = Path("data/recordings.json")
 
@@ -166,7 +168,7 @@ def show_teacher_recording_view():
                                 st.success("دانلود شروع شد")
 
                             if st.button("▶️ پخش", key=f"play_{rec['id']}"):
-                                st.video(file_path)
+                                st.video(media_server.media_url(file_path) or file_path)
                         else:
                             st.warning("در حال پردازش... یا فایل هنوز پیوست نشده است")
                             # Allow teacher to upload the actual recorded file to mark it ready
@@ -174,9 +176,7 @@ def show_teacher_recording_view():
                             if uploaded is not None:
                                 # save uploaded file to the recording file_path
                                 out_path = Path(rec.get('file_path') or (Path('recordings') / f"{rec['id']}.mp4"))
-                                out_path.parent.mkdir(parents=True, exist_ok=True)
-                                with open(out_path, 'wb') as f:
-                                    f.write(uploaded.getbuffer())
+                                storage.write_stream_atomic(out_path, uploaded)
                                 # update metadata
                                 recordings = load_recordings(st.session_state.room_id)
                                 for r in recordings:
@@ -282,7 +282,7 @@ def show_student_recording_view():
             with col1:
                 if file_exists:
                     if st.button("▶️ پخش آنلاین", key=f"play_{idx}"):
-                        st.video(file_path)
+                        st.video(media_server.media_url(file_path) or file_path)
                 else:
                     st.info("فایل ضبط هنوز پیوست نشده است")
 
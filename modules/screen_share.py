@@ -6,6 +6,20 @@ Screen Share Module
 import streamlit as st
 from pathlib import Path
 import base64
+from modules import moderation
+from modules import media_cache
+from modules import media_server
+from modules import media_variants
+from modules import storage
+from modules import webcam_publish
+
+try:
+    from streamlit_webrtc import webrtc_streamer
+except ImportError:  # not installed yet: still snapshots via st.camera_input
+    webrtc_streamer = None
+
+# Seconds between student checks of the camera version token
+CAMERA_POLL_INTERVAL = 1
 
 def show():
     """Show screen share interface"""
@@ -17,8 +31,10 @@ def show():
     
     st.info(f"کلاس فعال: {st.session_state.room_id}")
     
-    # Only teachers can share screen
-    if st.session_state.user_role == "مدرس":
+    # Teachers, and students given the screen share permission, can share
+    if (st.session_state.user_role == "مدرس" or
+            moderation.is_allowed(st.session_state.room_id, st.session_state.username,
+                                  moderation.SCREEN_SHARE_ALLOWED)):
         show_teacher_screen_share()
     else:
         show_student_screen_view()
@@ -43,9 +59,8 @@ def show_teacher_screen_share():
                 if st.button("شروع ارائه تصویر"):
                     # Save image for sharing
                     img_path = Path(f"data/screen_share/{st.session_state.room_id}_image.png")
-                    img_path.parent.mkdir(parents=True, exist_ok=True)
-                    with open(img_path, 'wb') as f:
-                        f.write(uploaded_image.getbuffer())
+                    storage.write_stream_atomic(img_path, uploaded_image)
+                    media_variants.request_variants(img_path)
                     st.success("تصویر در حال ارائه است")
             
             with col2:
@@ -66,9 +81,7 @@ def show_teacher_screen_share():
                 if st.button("شروع ارائه ویدیو"):
                     # Save video for sharing
                     vid_path = Path(f"data/screen_share/{st.session_state.room_id}_video.mp4")
-                    vid_path.parent.mkdir(parents=True, exist_ok=True)
-                    with open(vid_path, 'wb') as f:
-                        f.write(uploaded_video.getbuffer())
+                    storage.write_stream_atomic(vid_path, uploaded_video)
                     st.success("ویدیو در حال ارائه است")
             
             with col2:
@@ -84,33 +97,10 @@ def show_teacher_screen_share():
             st.success(f"لینک به اشتراک گذاشته شد: {link_url}")
             st.markdown(f"[باز کردن لینک]({link_url})")
 
-    # Camera snapshot sharing (teacher)
+    # Camera sharing (teacher)
     st.divider()
     st.write("### اشتراک‌گذاری از وب‌کم")
-    if "camera_snapshot_published" not in st.session_state:
-        st.session_state.camera_snapshot_published = False
-
-    # Capture image from teacher's webcam
-    camera_image = st.camera_input("نمای وب‌کم (اگر در مرورگر پشتیبانی شود)")
-    if camera_image is not None:
-        st.image(camera_image, caption="پیش‌نمایش وب‌کم", width=400)
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("انتشار تصویر وب‌کم"):
-                out_path = Path(f"data/screen_share/{st.session_state.room_id}_camera.png")
-                out_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(out_path, "wb") as f:
-                    f.write(camera_image.getbuffer())
-                st.session_state.camera_snapshot_published = True
-                st.success("تصویر وب‌کم منتشر شد")
-
-        with col2:
-            if st.button("حذف تصویر منتشرشده"):
-                out_path = Path(f"data/screen_share/{st.session_state.room_id}_camera.png")
-                if out_path.exists():
-                    out_path.unlink()
-                st.session_state.camera_snapshot_published = False
-                st.info("تصویر منتشرشده حذف شد")
+    show_camera_publisher(st.session_state.room_id)
     
     # Presentation controls
     st.divider()
@@ -129,6 +119,70 @@ def show_teacher_screen_share():
     with col4:
         if st.button("🔊 روشن صدا"):
             st.info("صدا روشن شد")
+    
+    with st.expander("وضعیت حافظه نهان رسانه"):
+        stats = media_cache.cache_stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("حجم", f"{stats['bytes'] / 1024 / 1024:.1f} / {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+        col2.metric("نرخ برخورد", f"{stats['hit_rate']:.0%}")
+        col3.metric("حذف‌شده‌ها", stats['evictions'])
+        variant_stats = media_variants.stats()
+        if variant_stats['errors']:
+            path, error = variant_stats['last_error']
+            st.warning(f"ساخت {variant_stats['errors']} نسخه کیفیتی ناموفق بود (آخرین: {Path(path).name}: {error})")
+
+def show_camera_publisher(room_id):
+    """Teacher webcam: continuous frames with streamlit-webrtc, snapshots otherwise"""
+    if webrtc_streamer is not None:
+        def publish(frame):
+            # Runs on the media thread; unchanged frames are dropped by the publisher
+            webcam_publish.publish_frame(room_id, frame.to_ndarray(format="rgb24"))
+            return frame
+
+        webrtc_streamer(key=f"camera_{room_id}", video_frame_callback=publish,
+                        media_stream_constraints={"video": True, "audio": False})
+    else:
+        # st.camera_input only takes still photos: each capture is a click
+        st.warning("اشتراک پیوسته وب‌کم به بسته streamlit-webrtc نیاز دارد "
+                   "(pip install -r requirements.txt). تا نصب آن، فقط تصاویر گرفته‌شده منتشر می‌شوند.")
+        continuous = st.checkbox("انتشار خودکار هر تصویر گرفته‌شده", key="camera_continuous")
+        camera_image = st.camera_input("نمای وب‌کم (اگر در مرورگر پشتیبانی شود)")
+        if camera_image is not None:
+            st.image(camera_image, caption="پیش‌نمایش وب‌کم", width=400)
+            if continuous:
+                webcam_publish.publish_frame(room_id, camera_image)
+            elif st.button("انتشار تصویر وب‌کم"):
+                webcam_publish.publish_frame(room_id, camera_image, force=True)
+                st.success("تصویر وب‌کم منتشر شد")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        stats = webcam_publish.get_publisher(room_id).stats()
+        st.caption(f"نسخه {stats['version']} · منتشرشده {stats['published']} · "
+                   f"ردشده بدون تغییر {stats['skipped']} · کیفیت {stats['quality']}")
+    with col2:
+        if st.button("حذف تصویر منتشرشده"):
+            webcam_publish.stop(room_id)
+            st.info("تصویر منتشرشده حذف شد")
+
+def show_camera_frame(room_id, width):
+    """Show the teacher's latest camera frame, reading it only when its version changed"""
+    current = webcam_publish.current_frame(room_id)
+    if current is None:
+        st.session_state.pop('camera_frame', None)
+        return False
+    version, path = current
+    cached = st.session_state.get('camera_frame')
+    if cached is None or cached[0] != version:
+        # Read directly: every version is a new file, and caching them would
+        # push the shared media out of the byte-bounded cache
+        try:
+            cached = (version, path.read_bytes())
+        except FileNotFoundError:
+            return False  # pruned by a newer frame; the next poll picks that up
+        st.session_state.camera_frame = cached
+    st.image(cached[1], caption="نمای وب‌کم مدرس", width=width)
+    return True
 
 def show_student_screen_view():
     """Show student screen view"""
@@ -137,35 +191,37 @@ def show_student_screen_view():
     # Check if there's shared content
     img_path = Path(f"data/screen_share/{st.session_state.room_id}_image.png")
     vid_path = Path(f"data/screen_share/{st.session_state.room_id}_video.mp4")
-    cam_path = Path(f"data/screen_share/{st.session_state.room_id}_camera.png")
     
     content_shown = False
+    
+    # Zoom sets the display width; quality picks the downscaled variant
+    zoom_level = st.session_state.get('share_zoom', 100)
+    quality = st.session_state.get('share_quality', 'متوسط')
+    width = int(700 * zoom_level / 100)
 
-    # Camera snapshot (prioritize teacher webcam snapshot)
-    if cam_path.exists():
-        try:
-            with open(cam_path, 'rb') as f:
-                cam_bytes = f.read()
-            st.image(cam_bytes, caption="نمای وب‌کم مدرس", width=700)
-            content_shown = True
-        except Exception:
-            # fallback to path if reading fails
-            st.image(str(cam_path), caption="نمای وب‌کم مدرس", width=700)
-            content_shown = True
+    # Teacher webcam first; polled in a fragment while it is being shared
+    if webcam_publish.current_frame(st.session_state.room_id) is not None:
+        fragment = getattr(st, "fragment", None)
+        if fragment is not None:
+            fragment(run_every=CAMERA_POLL_INTERVAL)(show_camera_frame)(st.session_state.room_id, width)
+        else:
+            show_camera_frame(st.session_state.room_id, width)
+        content_shown = True
 
     # Then fall back to shared image or video
     if not content_shown and img_path.exists():
         try:
-            with open(img_path, 'rb') as f:
-                img_bytes = f.read()
-            st.image(img_bytes, caption="تصویر ارائه شده توسط مدرس", width=700)
+            img_bytes = media_cache.read_media(media_variants.pick_variant(img_path, quality))
+            st.image(img_bytes if img_bytes is not None else str(img_path),
+                     caption="تصویر ارائه شده توسط مدرس", width=width)
             content_shown = True
         except Exception:
             st.image(str(img_path), caption="تصویر ارائه شده توسط مدرس", width=700)
             content_shown = True
         content_shown = True
     elif not content_shown and vid_path.exists():
-        st.video(str(vid_path))
+        # Streamed with Range requests so students can seek without downloading it all
+        st.video(media_server.media_url(vid_path) or str(vid_path))
         content_shown = True
 
     if not content_shown:
@@ -191,9 +247,10 @@ def show_student_screen_view():
     col1, col2 = st.columns(2)
     
     with col1:
-        zoom_level = st.slider("بزرگنمایی:", 50, 200, 100, 10)
+        zoom_level = st.slider("بزرگنمایی:", 50, 200, 100, 10, key="share_zoom")
         st.write(f"سطح بزرگنمایی: {zoom_level}%")
     
     with col2:
-        quality = st.select_slider("کیفیت:", options=['پایین', 'متوسط', 'بالا'], value='متوسط')
+        quality = st.select_slider("کیفیت:", options=['پایین', 'متوسط', 'بالا'], value='متوسط',
+                                   key="share_quality")
         st.write(f"کیفیت تصویر: {quality}")
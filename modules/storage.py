@@ -0,0 +1,63 @@
+"""
+ابزارهای مشترک ذخیره‌سازی
+Shared Storage Helpers
+"""
+
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+_json_cache = {}
+_json_cache_lock = threading.Lock()
+
+def file_version(path):
+    """Return a cheap (mtime_ns, size, inode) version token for a file, or None if missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def read_json_cached(path, default=None):
+    """Load a JSON file, parsing it only once per on-disk version.
+
+    The parsed object is shared by every session in the process, so callers
+    must treat it as read-only.
+    """
+    path = Path(path)
+    version = file_version(path)
+    if version is None:
+        return default
+
+    with _json_cache_lock:
+        cached = _json_cache.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    with _json_cache_lock:
+        _json_cache[path] = (version, data)
+    return data
+
+def write_json_atomic(path, data, indent=2):
+    """Write JSON to a temporary file and rename it over the target"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, path)
+
+def write_stream_atomic(path, stream, chunk_size=1024 * 1024):
+    """Copy a file-like object to ``path`` in chunks, then rename it into place"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    if hasattr(stream, 'seek'):
+        stream.seek(0)
+    with open(tmp_path, 'wb') as f:
+        shutil.copyfileobj(stream, f, chunk_size)
+    os.replace(tmp_path, path)
@@ -0,0 +1,144 @@
+"""
+ماژول جستجوی کاربران
+User Search Index Module
+"""
+
+import bisect
+import threading
+from collections import Counter, defaultdict
+
+from modules import storage
+from modules.auth import USERS_FILE, load_users
+
+# Arabic/Persian variants folded to a single form before indexing and searching
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ك': 'ک',
+    'ۀ': 'ه',
+    'ة': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    '‌': ' ',  # zero-width non-joiner
+    'ـ': None,  # tatweel
+    **{chr(0x064B + i): None for i in range(8)},  # harakat
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # Persian digits
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic digits
+})
+
+def normalize(text):
+    """Normalize a username or Persian name for matching"""
+    if not text:
+        return ""
+    return " ".join(text.translate(_CHAR_MAP).casefold().split())
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _query_trigrams(text):
+    # No boundary padding: a query may start or end mid-word
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class UserIndex:
+    """Prefix and trigram index over usernames and full names"""
+
+    def __init__(self, users):
+        self._names = {}
+        self._grams = defaultdict(set)
+        entries = []
+        for username, info in users.items():
+            full_name = info.get('full_name') or username
+            self._names[username] = full_name
+
+            terms = {normalize(username)}
+            normalized_name = normalize(full_name)
+            if normalized_name:
+                terms.add(normalized_name)
+                terms.update(normalized_name.split())
+            entries.extend((term, username) for term in terms if term)
+
+            for gram in _trigrams(f"{normalize(username)} {normalized_name}"):
+                self._grams[gram].add(username)
+
+        entries.sort()
+        self._terms = [term for term, _ in entries]
+        self._term_users = [username for _, username in entries]
+
+    def display_name(self, username):
+        """Return the full name of a user, falling back to the username"""
+        return self._names.get(username, username)
+
+    def search(self, query, k=10, allowed=None):
+        """Return up to k usernames matching the query, best matches first.
+
+        Prefix matches on the username, the full name or any word of it come
+        first; trigram overlap fills the remaining slots for typos and
+        mid-word matches. ``allowed`` restricts results to a set of usernames.
+        """
+        q = normalize(query)
+        if not q or k <= 0:
+            return []
+
+        results = []
+        seen = set()
+        i = bisect.bisect_left(self._terms, q)
+        while i < len(self._terms) and self._terms[i].startswith(q):
+            username = self._term_users[i]
+            if username not in seen and (allowed is None or username in allowed):
+                seen.add(username)
+                results.append(username)
+                if len(results) >= k:
+                    return results
+            i += 1
+
+        if len(q) >= 3:
+            grams = _query_trigrams(q)
+            shared = Counter()
+            for gram in grams:
+                for username in self._grams.get(gram, ()):
+                    if username not in seen and (allowed is None or username in allowed):
+                        shared[username] += 1
+            min_shared = max(1, len(grams) // 2)
+            ranked = sorted((-count, username) for username, count in shared.items() if count >= min_shared)
+            results.extend(username for _, username in ranked[:k - len(results)])
+
+        return results
+
+    def picker_options(self, query, participants, selected=(), k=20):
+        """Options for a search-driven participant picker.
+
+        Small lists are shown in full; otherwise only the current selection
+        plus the top-k matches for the query are returned.
+        """
+        if len(participants) <= k:
+            return list(participants)
+        options = list(selected)
+        chosen = set(options)
+        for username in self.search(query, k=k, allowed=set(participants)):
+            if username not in chosen:
+                options.append(username)
+        return options
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+def get_user_index():
+    """Return the process-wide user index, rebuilt only when users.json changes"""
+    global _index, _index_version
+    version = storage.file_version(USERS_FILE)
+    if _index is not None and version == _index_version:
+        return _index
+
+    with _index_lock:
+        if _index is None or version != _index_version:
+            if version is None:
+                users = load_users()
+                version = storage.file_version(USERS_FILE)
+            else:
+                users = storage.read_json_cached(USERS_FILE, {})
+            _index = UserIndex(users)
+            _index_version = version
+    return _index
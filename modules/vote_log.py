@@ -0,0 +1,203 @@
+"""
+ماژول ثبت آرا
+Vote Ingestion Module
+
+Votes are appended to a per-room log with a single O_APPEND write, so
+concurrent voters never overwrite each other. An aggregator folds new log
+entries into polls.json in batches with per-user last-write-wins, which
+makes replaying an entry harmless.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+from modules import poll_tally
+from modules import storage
+
+VOTES_DIR = Path("data/votes")
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+def _log_path(room_id):
+    return VOTES_DIR / f"{room_id}.jsonl"
+
+def _offset_path(room_id):
+    return VOTES_DIR / f"{room_id}.offset"
+
+def _read_offset(room_id):
+    try:
+        return int(_offset_path(room_id).read_text() or 0)
+    except FileNotFoundError:
+        return 0
+
+def _write_offset(room_id, offset):
+    path = _offset_path(room_id)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(str(offset))
+    os.replace(tmp_path, path)
+
+@contextmanager
+def polls_lock(polls_file, blocking=True):
+    """Serialize writers of a polls file across threads and processes.
+
+    Yields False without waiting if ``blocking`` is off and another writer
+    holds the lock.
+    """
+    polls_file = Path(polls_file)
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(polls_file.resolve(), threading.Lock())
+    if not thread_lock.acquire(blocking):
+        yield False
+        return
+    try:
+        polls_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(polls_file.with_suffix(".lock"), 'a') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+            yield True
+    finally:
+        thread_lock.release()
+
+def append_vote(room_id, poll_id, username, indices, ts=None, deadline=None):
+    """Append a vote to the room's log; the entry is written in one syscall.
+
+    Returns None without logging if the vote arrives after ``deadline``
+    (a Unix timestamp).
+    """
+    entry = {
+        'poll': poll_id,
+        'user': username,
+        'options': [int(i) for i in indices],
+        'ts': time.time() if ts is None else ts,
+    }
+    if deadline is not None and entry['ts'] > deadline:
+        return None
+    line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode('utf-8')
+    path = _log_path(room_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+    return entry
+
+def log_version(room_id):
+    """Cheap change token for a room's vote log (None if nothing was logged)"""
+    return storage.file_version(_log_path(room_id))
+
+def pending_bytes(room_id):
+    """Number of log bytes not yet folded into the polls file"""
+    version = storage.file_version(_log_path(room_id))
+    if version is None:
+        return 0
+    return version[1] - _read_offset(room_id)
+
+def apply_entry(poll, entry):
+    """Apply one log entry to a poll with last-write-wins per user.
+
+    Returns True if the poll changed. Entries older than (or equal to) the
+    user's current response are ignored, so re-applying is a no-op.
+    """
+    response_times = poll.setdefault('response_times', {})
+    user = entry['user']
+    if entry['ts'] <= response_times.get(user, float('-inf')):
+        return False
+    try:
+        poll_tally.apply_vote(poll, user, entry['options'])
+    except ValueError:
+        return False
+    response_times[user] = entry['ts']
+    return True
+
+def aggregate(room_id, polls_file, blocking=True):
+    """Fold new log entries for a room into the polls file.
+
+    Returns the number of entries applied. With ``blocking`` off, returns
+    immediately when another aggregator is already running; that one will
+    pick up the entries.
+    """
+    if pending_bytes(room_id) <= 0:
+        return 0
+
+    with polls_lock(polls_file, blocking=blocking) as acquired:
+        if not acquired:
+            return 0
+
+        offset = _read_offset(room_id)
+        with open(_log_path(room_id), 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+        # Leave a partially written trailing line for the next run
+        end = chunk.rfind(b"\n") + 1
+        if end == 0:
+            return 0
+
+        polls_file = Path(polls_file)
+        all_polls = {}
+        if polls_file.exists():
+            with open(polls_file, 'r', encoding='utf-8') as f:
+                all_polls = json.load(f)
+        polls_by_id = {poll['id']: poll for poll in all_polls.get(room_id, [])}
+
+        applied = 0
+        for line in chunk[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            poll = polls_by_id.get(entry.get('poll'))
+            if poll is not None and accept_entry(poll, entry) and apply_entry(poll, entry):
+                applied += 1
+
+        if applied:
+            storage.write_json_atomic(polls_file, all_polls)
+        _write_offset(room_id, offset + end)
+        return applied
+
+def accept_entry(poll, entry):
+    """Decide whether a log entry may still change the poll.
+
+    Votes cast before the poll was closed still count even if they are
+    aggregated afterwards; votes cast after the deadline never do.
+    """
+    deadline = poll.get('deadline')
+    if deadline and entry['ts'] > datetime.fromisoformat(deadline).timestamp():
+        return False
+    if poll.get('status', 'active') == 'active':
+        return True
+    closed_at = poll.get('closed_at')
+    if not closed_at:
+        return False
+    return entry['ts'] <= datetime.fromisoformat(closed_at).timestamp()
+
+def reconcile(room_id, poll_id, polls_file):
+    """Recount a poll's tallies from its responses under the writers' lock.
+
+    Returns True if the stored counters had drifted.
+    """
+    with polls_lock(polls_file):
+        with open(polls_file, 'r', encoding='utf-8') as f:
+            all_polls = json.load(f)
+        for poll in all_polls.get(room_id, []):
+            if poll['id'] == poll_id:
+                drifted = poll_tally.reconcile_tallies(poll)
+                if drifted:
+                    storage.write_json_atomic(polls_file, all_polls)
+                return drifted
+    return False
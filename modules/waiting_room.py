@@ -0,0 +1,100 @@
+"""
+ماژول اتاق انتظار
+Waiting Room Module
+"""
+
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from modules import storage
+
+WAITING_FILE = Path("data/waiting_room.json")
+
+APPROVED = "approved"
+DENIED = "denied"
+
+_write_lock = threading.Lock()
+_positions_cache = (None, {})
+
+def _empty_state():
+    return {'queue': [], 'decisions': {}}
+
+def load_waiting_room(room_id):
+    """Return the admission queue and decisions of a room (shared, read-only)"""
+    all_state = storage.read_json_cached(WAITING_FILE, {})
+    return all_state.get(room_id) or _empty_state()
+
+def waiting_list(room_id):
+    """Return queued join requests in arrival order"""
+    return load_waiting_room(room_id)['queue']
+
+def position(room_id, username):
+    """Return the 1-based queue position of a user, or None if not queued.
+
+    Positions for every room are computed once per version of the waiting
+    room file and shared by all sessions, so each waiting student only pays
+    for a stat and a dict lookup.
+    """
+    global _positions_cache
+    version = storage.file_version(WAITING_FILE)
+    cached_version, positions = _positions_cache
+    if version != cached_version:
+        all_state = storage.read_json_cached(WAITING_FILE, {})
+        positions = {
+            rid: {entry['username']: idx + 1 for idx, entry in enumerate(state['queue'])}
+            for rid, state in all_state.items()
+        }
+        _positions_cache = (version, positions)
+    return positions.get(room_id, {}).get(username)
+
+def decision(room_id, username):
+    """Return APPROVED, DENIED or None for a user's join request"""
+    return load_waiting_room(room_id)['decisions'].get(username)
+
+def _update(room_id, mutate):
+    with _write_lock:
+        all_state = dict(storage.read_json_cached(WAITING_FILE, {}))
+        old_state = all_state.get(room_id) or _empty_state()
+        state = {'queue': list(old_state['queue']), 'decisions': dict(old_state['decisions'])}
+        mutate(state)
+        all_state[room_id] = state
+        storage.write_json_atomic(WAITING_FILE, all_state)
+
+def enqueue(room_id, username, full_name=None):
+    """Add a join request to the end of the queue"""
+    if position(room_id, username) is not None:
+        return
+
+    def mutate(state):
+        if any(entry['username'] == username for entry in state['queue']):
+            return
+        state['decisions'].pop(username, None)
+        state['queue'].append({
+            'username': username,
+            'full_name': full_name or username,
+            'requested_at': datetime.now().isoformat(),
+        })
+
+    _update(room_id, mutate)
+
+def cancel(room_id, username):
+    """Remove a user's pending request and decision"""
+    def mutate(state):
+        state['queue'] = [entry for entry in state['queue'] if entry['username'] != username]
+        state['decisions'].pop(username, None)
+
+    _update(room_id, mutate)
+
+def decide(room_id, usernames, approve=True):
+    """Approve or deny a batch of queued users in a single write"""
+    usernames = set(usernames)
+    if not usernames:
+        return
+
+    def mutate(state):
+        state['queue'] = [entry for entry in state['queue'] if entry['username'] not in usernames]
+        for username in usernames:
+            state['decisions'][username] = APPROVED if approve else DENIED
+
+    _update(room_id, mutate)
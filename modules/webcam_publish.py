@@ -0,0 +1,170 @@
+"""
+ماژول انتشار پیوسته وب‌کم
+Webcam Publishing Module
+
+Continuous camera share. Each frame is compared with the last published one
+on a small grayscale thumbnail, and frames that barely changed are dropped.
+Published frames are written as JPEG to ``{room}_camera_v{n}.jpg`` by
+atomic rename. The JPEG quality adapts to keep frames near a size budget. A
+tiny version token, ``{room}_camera.json``, names the latest frame, so
+students poll one small file and read a frame only when the version changed.
+"""
+
+import io
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from modules import storage
+
+CAMERA_DIR = Path("data/screen_share")
+
+# Change detection on a DIFF_SIZE grayscale thumbnail: a frame is published
+# when more than CHANGE_THRESHOLD of its pixels moved by more than PIXEL_DELTA
+DIFF_SIZE = (64, 48)
+PIXEL_DELTA = 12
+CHANGE_THRESHOLD = 0.01
+
+# Adaptive JPEG quality: steer encoded frames towards TARGET_FRAME_BYTES
+TARGET_FRAME_BYTES = 60 * 1024
+MIN_QUALITY = 35
+MAX_QUALITY = 85
+START_QUALITY = 70
+
+MAX_WIDTH = 1280
+# Older frames kept on disk for students still reading them
+KEEP_FRAMES = 3
+
+def token_path(room_id):
+    return CAMERA_DIR / f"{room_id}_camera.json"
+
+def frame_path(room_id, version):
+    return CAMERA_DIR / f"{room_id}_camera_v{version}.jpg"
+
+def to_image(frame):
+    """PIL image from an uploaded file, raw bytes, an RGB array or an image"""
+    if isinstance(frame, Image.Image):
+        return frame
+    if isinstance(frame, np.ndarray):
+        return Image.fromarray(frame)
+    if isinstance(frame, (bytes, bytearray)):
+        frame = io.BytesIO(frame)
+    elif hasattr(frame, 'seek'):
+        frame.seek(0)
+    with Image.open(frame) as image:
+        image.load()
+        return image
+
+def signature(image):
+    """Downsampled grayscale copy of a frame used for change detection"""
+    return np.asarray(image.convert('L').resize(DIFF_SIZE, Image.BILINEAR), dtype=np.int16)
+
+def changed_fraction(previous, current):
+    """Share of thumbnail pixels that changed noticeably between two signatures"""
+    if previous is None or previous.shape != current.shape:
+        return 1.0
+    return np.count_nonzero(np.abs(current - previous) > PIXEL_DELTA) / current.size
+
+def read_token(room_id):
+    """Latest published frame of a room: {'version', 'file', 'ts'}, or None"""
+    return storage.read_json_cached(token_path(room_id), None)
+
+class CameraPublisher:
+    """Publishes one room's camera frames; safe to call from a media thread"""
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.quality = START_QUALITY
+        self.published = 0
+        self.skipped = 0
+        self._signature = None
+        self._lock = threading.Lock()
+        token = read_token(room_id)
+        self.version = token['version'] if token else 0
+
+    def publish(self, frame, force=False):
+        """Publish a frame unless it matches the previous one; returns True if written"""
+        image = to_image(frame)
+        current = signature(image)
+        with self._lock:
+            if not force and changed_fraction(self._signature, current) < CHANGE_THRESHOLD:
+                self.skipped += 1
+                return False
+            self._signature = current
+            self.version += 1
+            version = self.version
+            data = self._encode(image)
+            self._write(version, data)
+            self.published += 1
+        return True
+
+    def _encode(self, image):
+        if image.width > MAX_WIDTH:
+            image = image.resize((MAX_WIDTH, max(1, round(image.height * MAX_WIDTH / image.width))),
+                                 Image.BILINEAR)
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, format="JPEG", quality=self.quality)
+        size = buffer.tell()
+        # Adjust for the next frame: back off fast when too large, recover slowly
+        if size > TARGET_FRAME_BYTES * 1.2:
+            self.quality = max(MIN_QUALITY, self.quality - 10)
+        elif size < TARGET_FRAME_BYTES * 0.6:
+            self.quality = min(MAX_QUALITY, self.quality + 5)
+        return buffer.getvalue()
+
+    def _write(self, version, data):
+        path = frame_path(self.room_id, version)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        # The frame is in place before the token points at it
+        storage.write_json_atomic(token_path(self.room_id),
+                                  {'version': version, 'file': path.name, 'ts': time.time()},
+                                  indent=None)
+        stale = frame_path(self.room_id, version - KEEP_FRAMES)
+        if stale.exists():
+            stale.unlink(missing_ok=True)
+
+    def stats(self):
+        return {'version': self.version, 'published': self.published,
+                'skipped': self.skipped, 'quality': self.quality}
+
+_publishers = {}
+_publishers_lock = threading.Lock()
+
+def get_publisher(room_id):
+    """Process-wide publisher of a room"""
+    with _publishers_lock:
+        if room_id not in _publishers:
+            _publishers[room_id] = CameraPublisher(room_id)
+        return _publishers[room_id]
+
+def publish_frame(room_id, frame, force=False):
+    return get_publisher(room_id).publish(frame, force=force)
+
+def current_frame(room_id):
+    """(version, path) of the latest published frame, or None"""
+    token = read_token(room_id)
+    if not token:
+        return None
+    path = CAMERA_DIR / token['file']
+    return (token['version'], path) if path.exists() else None
+
+def stop(room_id):
+    """Withdraw the camera share and remove its frames"""
+    path = token_path(room_id)
+    if path.exists():
+        path.unlink(missing_ok=True)
+    for frame in CAMERA_DIR.glob(f"{room_id}_camera_v*.jpg"):
+        frame.unlink(missing_ok=True)
+    with _publishers_lock:
+        publisher = _publishers.get(room_id)
+    if publisher is not None:
+        with publisher._lock:
+            publisher._signature = None
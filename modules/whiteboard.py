@@ -6,24 +6,164 @@ Whiteboard Module
 import streamlit as st
 from streamlit_drawable_canvas import st_canvas
 import json
+from datetime import datetime, timedelta
 from pathlib import Path
 # Use the UI helper for safe rerun when available
 try:
     from modules import ui
 except Exception:
     ui = None
-import numpy as np
-from PIL import Image
+from modules import moderation
+from modules import whiteboard_publish
+from modules import whiteboard_ops
+from modules import whiteboard_timeline
+from modules import whiteboard_pages
+from modules import whiteboard_presenter
+from modules import whiteboard_tiles
+from modules import media_cache
+from modules import classroom
+
+# Seconds between checks for new board operations in the viewer
+SYNC_INTERVAL = 2
+
+# Page thumbnails shown around the current page
+PAGE_STRIP = 6
+
+def show_live_board(room_id):
+    """Render the published board from the viewer's synced scene"""
+    pages = whiteboard_pages.load_pages(room_id)
+    board_id = whiteboard_pages.current_board(room_id)
+    if len(pages['pages']) > 1:
+        st.caption(f"صفحه {pages['pages'].index(board_id) + 1} از {len(pages['pages'])}")
+    cursor = st.session_state.setdefault('whiteboard_cursor', {})
+    whiteboard_ops.sync_scene(cursor, board_id)
+    st_canvas(
+        initial_drawing=whiteboard_ops.to_fabric(cursor['scene']),
+        background_color=cursor['scene'].get('background') or "#FFFFFF",
+        height=500,
+        drawing_mode="transform",
+        display_toolbar=False,
+        update_streamlit=False,
+        key=f"canvas_view_{board_id}",
+    )
+    st.caption("تخته سفید (ارائه شده توسط مدرس)")
+    
+    fragment = getattr(st, "fragment", None)
+    if fragment is not None:
+        fragment(run_every=SYNC_INTERVAL)(watch_live_board)(room_id, board_id)
+
+def watch_live_board(room_id, board_id):
+    """Fetch new operations; rerun the page only when the board changed.
+
+    Idle ticks draw nothing, so the scene is not sent to the viewer again.
+    """
+    cursor = st.session_state.setdefault('whiteboard_cursor', {})
+    if (whiteboard_pages.current_board(room_id) != board_id or
+            whiteboard_ops.sync_scene(cursor, board_id)):
+        st.rerun()
+
+def show_timeline(board_id):
+    """Scrub through the board's history, rebuilt from the nearest keyframe"""
+    bounds = whiteboard_timeline.time_range(board_id)
+    if bounds is None or bounds[0] == bounds[1]:
+        st.info("هنوز تاریخچه‌ای برای این تخته ثبت نشده است")
+        return
+    start, end = (datetime.fromtimestamp(ts).replace(microsecond=0) for ts in bounds)
+    end += timedelta(seconds=1)
+    moment = st.slider("زمان:", min_value=start, max_value=end, value=end,
+                       step=timedelta(seconds=1), format="HH:mm:ss", key=f"timeline_{board_id}")
+    scene = whiteboard_timeline.scene_at(board_id, moment.timestamp())
+    st_canvas(
+        initial_drawing=whiteboard_ops.to_fabric(scene),
+        background_color=scene.get('background') or "#FFFFFF",
+        height=500,
+        drawing_mode="transform",
+        display_toolbar=False,
+        update_streamlit=False,
+        key=f"canvas_timeline_{board_id}",
+    )
+
+def show_page_bar(room_id):
+    """Page switcher with thumbnails of the pages around the current one"""
+    pages = whiteboard_pages.load_pages(room_id)
+    boards = pages['pages']
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        index = st.selectbox("صفحه:", range(len(boards)), index=pages['current'],
+                             format_func=lambda i: f"صفحه {i + 1}")
+        if index != pages['current']:
+            whiteboard_pages.set_current(room_id, index)
+            st.rerun()
+    with col2:
+        if st.button("➕ صفحه جدید"):
+            whiteboard_pages.add_page(room_id)
+            st.rerun()
+    
+    if len(boards) > 1:
+        start = max(0, min(pages['current'] - PAGE_STRIP // 2, len(boards) - PAGE_STRIP))
+        cols = st.columns(PAGE_STRIP)
+        for col, i in zip(cols, range(start, min(len(boards), start + PAGE_STRIP))):
+            with col:
+                thumb = whiteboard_pages.thumbnail(boards[i])
+                label = f"صفحه {i + 1}" + (" ●" if i == pages['current'] else "")
+                if thumb is not None:
+                    st.image(media_cache.read_media(thumb), caption=label)
+                else:
+                    st.caption(label)
+
+def show_presenter_bar(board_id, can_publish, auto_claim=False):
+    """Show who holds the pen and let eligible users take it.
+
+    ``auto_claim`` gives a free pen to this user (the teacher, or the first
+    member of a breakout room to open the board). Returns the presenter record.
+    """
+    username = st.session_state.username
+    presenter = whiteboard_presenter.current_presenter(board_id)
+    if presenter is None and can_publish and auto_claim:
+        presenter = whiteboard_presenter.claim(board_id, username, only_if_free=True)
+    if not can_publish or (presenter is not None and presenter['username'] == username):
+        return presenter
+    
+    from modules.user_index import get_user_index
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        if presenter is None:
+            st.caption("کسی در حال ارائه روی این تخته نیست")
+        else:
+            st.caption(f"✏️ قلم در دست {get_user_index().display_name(presenter['username'])} است")
+    with col2:
+        if st.button("در دست گرفتن قلم"):
+            whiteboard_presenter.claim(board_id, username)
+            st.rerun()
+    return presenter
 
 def show():
     """Show whiteboard interface"""
     st.title("🖍️ تخته سفید")
     
-    if not st.session_state.room_id:
+    room_id = classroom.active_room_id()
+    if not room_id:
         st.warning("ابتدا باید وارد یک کلاس شوید")
         return
     
-    st.info(f"کلاس فعال: {st.session_state.room_id}")
+    st.info(f"کلاس فعال: {room_id}")
+    
+    # Students with the whiteboard permission may present like the teacher does;
+    # members of a breakout room share their room's board
+    parent, breakout_id = classroom.split_room_id(room_id)
+    can_publish = (st.session_state.get('user_role') == "مدرس" or
+                   breakout_id is not None or
+                   moderation.is_allowed(parent, st.session_state.username,
+                                         moderation.WHITEBOARD_ALLOWED))
+    
+    if can_publish:
+        show_page_bar(room_id)
+    board_id = whiteboard_pages.current_board(room_id)
+    presenter = show_presenter_bar(board_id, can_publish,
+                                   auto_claim=st.session_state.get('user_role') == "مدرس" or
+                                   breakout_id is not None)
+    is_presenter = presenter is not None and presenter['username'] == st.session_state.username
     
     # Drawing tools
     col1, col2, col3, col4 = st.columns(4)
@@ -52,7 +192,13 @@ def show():
     with col3:
         load_board = st.button("بارگذاری تخته")
     
-    # Canvas
+    # Canvas, reopened with the page's recorded drawing (fixed per session so
+    # the component is not reloaded on every stroke); taking the pen reopens it
+    claim = presenter['claim'] if is_presenter else 0
+    initial_key = f"wb_initial_{board_id}_{claim}"
+    if is_presenter and initial_key not in st.session_state:
+        scene, _ = whiteboard_ops.snapshot(board_id)
+        st.session_state[initial_key] = whiteboard_ops.to_fabric(scene) if scene['objects'] else None
     canvas_result = st_canvas(
         fill_color="rgba(255, 165, 0, 0.3)",
         stroke_width=stroke_width,
@@ -60,19 +206,25 @@ def show():
         background_color=bg_color,
         height=500,
         drawing_mode=drawing_mode,
-        key="canvas",
+        initial_drawing=st.session_state.get(initial_key),
+        key=f"canvas_{board_id}_{claim}" if is_presenter else f"canvas_{board_id}",
     )
 
-    # Shared whiteboard image path (auto-saved snapshot of canvas)
-    wb_image_path = Path(f"data/whiteboards/{st.session_state.room_id}_canvas.png")
+    # Published image of the page: dirty tiles (a plain PNG for boards saved before tiles)
+    wb_image_path = whiteboard_pages.image_path(board_id)
+    wb_tiles_dir = whiteboard_tiles.tile_dir(wb_image_path)
 
-    # If user is not a teacher, show the latest published whiteboard snapshot (read-only)
-    # This allows students to view what the teacher is drawing (simple polling / refresh).
-    if st.session_state.get('user_role') != "مدرس":
-        if wb_image_path.exists():
+    # Everyone but the presenter follows the published board (read-only): the
+    # vector scene is synced from the operation log, the composed tiles are the fallback.
+    if not is_presenter:
+        if (whiteboard_ops.ops_path(board_id).exists() or
+                whiteboard_pages.pages_path(room_id).exists()):
+            show_live_board(room_id)
+        elif wb_tiles_dir.exists() or wb_image_path.exists():
             try:
-                with open(wb_image_path, 'rb') as f:
-                    img_bytes = f.read()
+                img_bytes = whiteboard_tiles.composite_png(wb_tiles_dir)
+                if img_bytes is None:
+                    img_bytes = media_cache.read_media(wb_image_path)
                 st.image(img_bytes, caption="تخته سفید (ارائه شده توسط مدرس)", width=700)
             except Exception:
                 st.image(str(wb_image_path), caption="تخته سفید (ارائه شده توسط مدرس)", width=700)
@@ -87,35 +239,47 @@ def show():
                         rerun()
         else:
             st.info("تخته‌ای توسط مدرس منتشر نشده است")
-        # Students shouldn't get the drawing controls below; return early
+        # Only the presenter gets the drawing controls below; return early
         return
     
+    # Record the vector changes for viewers; nothing is written if the scene is unchanged
+    try:
+        if canvas_result is not None and canvas_result.json_data is not None:
+            if whiteboard_ops.record(board_id, canvas_result.json_data):
+                whiteboard_timeline.add_keyframe(board_id)
+    except Exception:
+        pass
+    
     # Save whiteboard data (explicit save to JSON)
     if save_board:
         if canvas_result.json_data is not None:
-            wb_path = Path(f"data/whiteboards/{st.session_state.room_id}.json")
+            wb_path = Path(f"data/whiteboards/{board_id}.json")
             wb_path.parent.mkdir(parents=True, exist_ok=True)
             with open(wb_path, 'w', encoding='utf-8') as f:
                 json.dump(canvas_result.json_data, f)
+            whiteboard_timeline.add_keyframe(board_id, force=True)
             st.success("تخته سفید ذخیره شد!")
+            # The full image is composed from the published tiles only when exported
+            whiteboard_publish.flush(timeout=5)
+            image_bytes = whiteboard_tiles.composite_png(wb_tiles_dir)
+            if image_bytes:
+                st.download_button("⬇️ دانلود تصویر تخته", image_bytes,
+                                   file_name=f"{wb_image_path.stem}.png", mime="image/png")
 
-    # Auto-save an image snapshot of the canvas so students can quickly view the latest drawing.
-    # st_canvas returns image_data as an ndarray (RGBA). Convert and save as PNG.
+    # Auto-publish the canvas image as tiles for thumbnails, exports and older viewers.
+    # Unchanged frames are skipped and only changed tiles are encoded, off the script thread.
     try:
         if canvas_result is not None and getattr(canvas_result, 'image_data', None) is not None:
-            arr = canvas_result.image_data
-            # Convert float images to uint8 if needed
-            if arr.dtype != np.uint8:
-                arr = (arr * 255).astype('uint8')
-            img = Image.fromarray(arr)
-            wb_image_path.parent.mkdir(parents=True, exist_ok=True)
-            img.save(wb_image_path)
+            whiteboard_publish.publish_tiles(wb_tiles_dir, canvas_result.image_data)
             # Indicate published state
             st.session_state['whiteboard_published'] = True
     except Exception:
-        # Non-fatal; don't block the UI if saving snapshot fails
+        # Non-fatal; don't block the UI if publishing the snapshot fails
         pass
     
+    with st.expander("⏪ بازبینی تاریخچه تخته"):
+        show_timeline(board_id)
+    
     # Text tools
     st.divider()
     st.subheader("ابزار متن")
@@ -0,0 +1,206 @@
+"""
+ماژول همگام‌سازی برداری تخته سفید
+Whiteboard Vector Sync Module
+
+The publisher's Fabric.js scene (``json_data['objects']`` of st_canvas) is
+diffed against the last recorded scene and the difference is appended to
+an operation log, one JSON line per operation with a sequence number:
+
+    {"seq": 12, "ts": ..., "op": "add", "index": 7, "object": {...}}
+    {"seq": 13, "ts": ..., "op": "modify", "index": 3, "object": {...}}
+    {"seq": 14, "ts": ..., "op": "remove", "index": 7}
+    {"seq": 15, "ts": ..., "op": "clear"}
+    {"seq": 16, "ts": ..., "op": "background", "value": "#FFFFFF"}
+
+Viewers keep a byte cursor into the log and replay only new operations
+onto their local copy of the scene.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from modules import storage
+
+OPS_DIR = Path("data/whiteboards")
+
+# Fabric.js version reported in scenes rebuilt from the log
+FABRIC_VERSION = "4.4.0"
+
+# Recorded scenes kept in memory; older boards are rebuilt from their log
+MAX_LOADED_BOARDS = 8
+
+_boards = OrderedDict()
+_boards_lock = threading.Lock()
+
+def ops_path(board_id):
+    """Operation log of a board (a room, sub-room or page id)"""
+    return OPS_DIR / f"{board_id}.ops.jsonl"
+
+def diff_objects(old, new):
+    """Operations that turn the object list ``old`` into ``new``.
+
+    Objects have no ids in st_canvas, so they are matched by position:
+    strokes are appended, transforms change an object in place and undo
+    drops objects from the end.
+    """
+    if old and not new:
+        return [{'op': 'clear'}]
+    ops = []
+    common = min(len(old), len(new))
+    for index in range(common):
+        if old[index] != new[index]:
+            ops.append({'op': 'modify', 'index': index, 'object': new[index]})
+    for index in range(common, len(new)):
+        ops.append({'op': 'add', 'index': index, 'object': new[index]})
+    for index in range(len(old) - 1, common - 1, -1):
+        ops.append({'op': 'remove', 'index': index})
+    return ops
+
+def apply_op(scene, op):
+    """Apply one operation to a scene dict with ``objects`` and ``background``"""
+    objects = scene['objects']
+    kind = op['op']
+    if kind == 'add':
+        objects.insert(op['index'], op['object'])
+    elif kind == 'modify':
+        if op['index'] < len(objects):
+            objects[op['index']] = op['object']
+    elif kind == 'remove':
+        if op['index'] < len(objects):
+            del objects[op['index']]
+    elif kind == 'clear':
+        objects.clear()
+    elif kind == 'background':
+        scene['background'] = op['value']
+    scene['seq'] = op.get('seq', scene.get('seq', 0))
+    scene['ts'] = op.get('ts', scene.get('ts'))
+    return scene
+
+def empty_scene():
+    return {'objects': [], 'background': None, 'seq': 0, 'ts': None}
+
+def replay(ops, scene=None):
+    """Apply operations in order to a scene (a new empty one by default)"""
+    scene = empty_scene() if scene is None else scene
+    for op in ops:
+        apply_op(scene, op)
+    return scene
+
+def to_fabric(scene):
+    """Scene in the shape st_canvas accepts as ``initial_drawing``"""
+    drawing = {'version': FABRIC_VERSION, 'objects': scene['objects']}
+    if scene.get('background'):
+        drawing['background'] = scene['background']
+    return drawing
+
+def _read_lines(path, offset):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        chunk = f.read()
+    # Leave a partially written trailing line for the next read
+    end = chunk.rfind(b"\n") + 1
+    ops = []
+    for line in chunk[:end].splitlines():
+        try:
+            ops.append(json.loads(line))
+        except ValueError:
+            continue
+    return ops, offset + end
+
+def fetch_ops(board_id, offset=0):
+    """Operations appended to a board's log after byte ``offset``.
+
+    Returns (ops, new_offset). If the log was reset since the cursor was
+    taken, the result starts with a ``clear`` operation and replays the
+    whole log.
+    """
+    path = ops_path(board_id)
+    version = storage.file_version(path)
+    if version is None:
+        return ([{'op': 'clear'}] if offset else []), 0
+    if version[1] == offset:
+        return [], offset
+    if version[1] < offset:
+        ops, new_offset = _read_lines(path, 0)
+        return [{'op': 'clear'}] + ops, new_offset
+    return _read_lines(path, offset)
+
+def _board_state(board_id):
+    """Last recorded scene of a board, rebuilt from its log once per process"""
+    with _boards_lock:
+        state = _boards.get(board_id)
+        if state is None:
+            ops, offset = fetch_ops(board_id)
+            state = {'scene': replay(ops), 'offset': offset, 'lock': threading.Lock()}
+            _boards[board_id] = state
+            while len(_boards) > MAX_LOADED_BOARDS:
+                _boards.popitem(last=False)
+        else:
+            _boards.move_to_end(board_id)
+    return state
+
+def record(board_id, json_data, ts=None):
+    """Append the changes between the recorded scene and ``json_data``.
+
+    All operations of one call are written with a single append. Returns
+    the number of operations recorded (0 when nothing changed).
+    """
+    if not json_data:
+        return 0
+    state = _board_state(board_id)
+    with state['lock']:
+        scene = state['scene']
+        ops = diff_objects(scene['objects'], json_data.get('objects', []))
+        background = json_data.get('background')
+        if background and background != scene.get('background'):
+            ops.append({'op': 'background', 'value': background})
+        if not ops:
+            return 0
+
+        ts = time.time() if ts is None else ts
+        seq = scene.get('seq', 0)
+        lines = []
+        for op in ops:
+            seq += 1
+            op['seq'] = seq
+            op['ts'] = ts
+            lines.append(json.dumps(op, ensure_ascii=False, separators=(",", ":")))
+
+        path = ops_path(board_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, ("\n".join(lines) + "\n").encode('utf-8'))
+            state['offset'] = os.lseek(fd, 0, os.SEEK_CUR)
+        finally:
+            os.close(fd)
+        replay(ops, scene)
+    return len(ops)
+
+def recorded_seq(board_id):
+    """Sequence number of the last recorded operation"""
+    return _board_state(board_id)['scene'].get('seq', 0)
+
+def snapshot(board_id):
+    """Copy of the recorded scene and the log offset it corresponds to"""
+    state = _board_state(board_id)
+    with state['lock']:
+        return json.loads(json.dumps(state['scene'])), state['offset']
+
+def sync_scene(cursor, board_id):
+    """Bring a viewer's cached scene up to date.
+
+    ``cursor`` is a dict kept by the viewer (e.g. in session state) with the
+    board id, byte offset and scene; it is updated in place. Returns the
+    number of new operations applied.
+    """
+    if cursor.get('board_id') != board_id:
+        cursor.clear()
+        cursor.update({'board_id': board_id, 'offset': 0, 'scene': empty_scene()})
+    ops, cursor['offset'] = fetch_ops(board_id, cursor['offset'])
+    replay(ops, cursor['scene'])
+    return len(ops)
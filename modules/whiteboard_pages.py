@@ -0,0 +1,95 @@
+"""
+ماژول صفحات تخته سفید
+Whiteboard Pages Module
+
+A room's whiteboard is a list of pages. Each page is a board of its own,
+with its own operation log, timeline and tiles. The first page keeps the
+room id as its board id, so boards drawn before pages existed remain page
+one. Only the page on screen is loaded. Small thumbnails of the other pages
+are rendered from their tiles on a background thread and refreshed when a
+page's tiles change.
+"""
+
+import os
+import threading
+
+from PIL import Image
+
+from modules import background
+from modules import storage
+from modules import whiteboard_ops
+from modules import whiteboard_tiles
+
+THUMBNAIL_WIDTH = 160
+
+_pages_lock = threading.Lock()
+
+def pages_path(room_id):
+    return whiteboard_ops.OPS_DIR / f"{room_id}.pages.json"
+
+def load_pages(room_id):
+    """Page list of a room: {'pages': [board ids], 'current': index}"""
+    return storage.read_json_cached(pages_path(room_id), None) or {'pages': [room_id], 'current': 0}
+
+def current_board(room_id):
+    """Board id of the page everyone is looking at"""
+    pages = load_pages(room_id)
+    return pages['pages'][min(pages['current'], len(pages['pages']) - 1)]
+
+def add_page(room_id):
+    """Append a page and make it current; returns its board id"""
+    with _pages_lock:
+        pages = dict(load_pages(room_id))
+        board_id = f"{room_id}_page{len(pages['pages']) + 1}"
+        pages['pages'] = pages['pages'] + [board_id]
+        pages['current'] = len(pages['pages']) - 1
+        storage.write_json_atomic(pages_path(room_id), pages)
+    return board_id
+
+def set_current(room_id, index):
+    """Switch every viewer of the room to another page"""
+    with _pages_lock:
+        pages = dict(load_pages(room_id))
+        if 0 <= index < len(pages['pages']) and index != pages['current']:
+            pages['current'] = index
+            storage.write_json_atomic(pages_path(room_id), pages)
+
+def image_path(board_id):
+    """Published snapshot path of a page (its tiles live next to it)"""
+    return whiteboard_ops.OPS_DIR / f"{board_id}_canvas.png"
+
+def thumbnail_path(board_id):
+    return whiteboard_ops.OPS_DIR / f"{board_id}_thumb.png"
+
+def _thumbnail_stale(board_id):
+    manifest = storage.file_version(
+        whiteboard_tiles.tile_dir(image_path(board_id)) / whiteboard_tiles.MANIFEST_NAME)
+    if manifest is None:
+        return False
+    thumb = storage.file_version(thumbnail_path(board_id))
+    return thumb is None or thumb[0] < manifest[0]
+
+def render_thumbnail(board_id, width=THUMBNAIL_WIDTH):
+    """Write a small PNG of a page from its tiles; returns False if it has none"""
+    image = whiteboard_tiles.composite(whiteboard_tiles.tile_dir(image_path(board_id)))
+    if image is None:
+        return False
+    height = max(1, round(image.height * width / image.width))
+    image = image.resize((width, height), Image.LANCZOS)
+    path = thumbnail_path(board_id)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    image.save(tmp_path, format="PNG")
+    os.replace(tmp_path, path)
+    return True
+
+_thumbnails = background.KeyedWorker(render_thumbnail, "whiteboard-thumbnails")
+
+def thumbnail(board_id):
+    """Path of a page's thumbnail, refreshed in the background when stale.
+
+    Returns None while a page has no thumbnail yet.
+    """
+    if _thumbnail_stale(board_id):
+        _thumbnails.request(board_id)
+    path = thumbnail_path(board_id)
+    return path if path.exists() else None
@@ -0,0 +1,39 @@
+"""
+ماژول ارائه‌دهنده تخته سفید
+Whiteboard Presenter Module
+
+Each board has one presenter, the holder of the pen. Only the presenter's
+canvas is recorded into the board's operation log; everyone else follows
+the live board. Taking the pen bumps a claim number, so the new presenter's
+canvas is reopened from the shared scene instead of from a stale local one.
+"""
+
+import threading
+import time
+
+from modules import storage
+from modules import whiteboard_ops
+
+_claim_lock = threading.Lock()
+
+def presenter_path(board_id):
+    return whiteboard_ops.OPS_DIR / f"{board_id}.presenter.json"
+
+def current_presenter(board_id):
+    """{'username', 'claim', 'ts'} of the pen holder, or None"""
+    return storage.read_json_cached(presenter_path(board_id), None)
+
+def claim(board_id, username, only_if_free=False):
+    """Give the pen to a user; returns the presenter record afterwards.
+
+    With ``only_if_free`` the pen is taken only when nobody holds it.
+    """
+    with _claim_lock:
+        record = current_presenter(board_id)
+        if record is not None and (only_if_free or record['username'] == username):
+            return record
+        record = {'username': username,
+                  'claim': (record['claim'] + 1) if record else 1,
+                  'ts': time.time()}
+        storage.write_json_atomic(presenter_path(board_id), record, indent=None)
+        return record
@@ -0,0 +1,101 @@
+"""
+ماژول انتشار تصویر تخته سفید
+Whiteboard Snapshot Publishing Module
+
+A teacher rerun only hashes the canvas buffer. Frames that changed are
+handed to a background encoder thread, which re-encodes only the tiles that
+differ from the previous frame (see whiteboard_tiles). When frames arrive
+faster than they can be encoded, only the newest frame of each board is kept.
+"""
+
+import hashlib
+import threading
+
+import numpy as np
+
+from modules import whiteboard_tiles
+
+def to_uint8(frame):
+    """Return an RGBA canvas buffer as a contiguous uint8 array"""
+    if frame.dtype != np.uint8:
+        frame = (frame * 255).astype('uint8')
+    return np.ascontiguousarray(frame)
+
+def frame_digest(frame):
+    """Fingerprint of a frame's pixels and shape"""
+    digest = hashlib.blake2b(repr(frame.shape).encode(), digest_size=16)
+    digest.update(frame.data)
+    return digest.digest()
+
+class SnapshotPublisher:
+    """Runs ``encode(key, frame)`` for changed canvas frames on a single background thread"""
+
+    def __init__(self, encode):
+        self._encode = encode
+        self._digests = {}
+        self._pending = {}
+        self._busy = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self.encoded = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def submit(self, path, frame):
+        """Queue a frame for publishing.
+
+        Returns False without queuing anything when the frame is identical
+        to the last one submitted for ``path``.
+        """
+        path = str(path)
+        frame = to_uint8(frame)
+        digest = frame_digest(frame)
+        with self._cond:
+            if self._digests.get(path) == digest:
+                self.skipped += 1
+                return False
+            self._digests[path] = digest
+            self._pending[path] = frame
+            self._ensure_worker()
+            self._cond.notify()
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until every queued frame is written; returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="whiteboard-encoder", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                path, frame = self._pending.popitem()
+                self._busy += 1
+            try:
+                self._encode(path, frame)
+                self.encoded += 1
+            except Exception:
+                # Forget the digest so the same frame is retried next time
+                self.errors += 1
+                with self._cond:
+                    if self._digests.get(path) == frame_digest(frame):
+                        del self._digests[path]
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._cond.notify_all()
+
+_tile_publisher = SnapshotPublisher(encode=whiteboard_tiles.write_tiles)
+
+def publish_tiles(directory, frame):
+    """Publish a canvas frame as tiles, re-encoding only the changed ones"""
+    return _tile_publisher.submit(directory, frame)
+
+def flush(timeout=None):
+    """Wait for pending tiles to be written"""
+    return _tile_publisher.flush(timeout)
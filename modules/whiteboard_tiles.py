@@ -0,0 +1,171 @@
+"""
+ماژول کاشی‌بندی تصویر تخته سفید
+Whiteboard Tile Module
+
+A published board image is kept as a grid of PNG tiles plus a manifest.
+A new frame is compared with the previous one in NumPy and only the tiles
+whose pixels changed are re-encoded and rewritten. The full image is
+composed from the tiles on demand (export, viewers that cannot render the
+vector scene) and cached per manifest version.
+"""
+
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from modules import storage
+
+TILE_SIZE = 64
+MANIFEST_NAME = "manifest.json"
+
+# Tiled images kept in memory (each holds its last full frame)
+MAX_LOADED_BOARDS = 8
+
+_stores = OrderedDict()
+_stores_lock = threading.Lock()
+_composites = OrderedDict()
+_composites_lock = threading.Lock()
+
+def grid_shape(height, width, tile_size=TILE_SIZE):
+    """Number of (rows, columns) of tiles covering an image"""
+    return -(-height // tile_size), -(-width // tile_size)
+
+def dirty_tiles(previous, frame, tile_size=TILE_SIZE):
+    """Return (row, col) of every tile whose pixels differ between two frames.
+
+    All tiles are dirty when there is no previous frame or its shape changed.
+    """
+    rows, cols = grid_shape(frame.shape[0], frame.shape[1], tile_size)
+    if previous is None or previous.shape != frame.shape:
+        return [(r, c) for r in range(rows) for c in range(cols)]
+
+    if frame.ndim == 3 and frame.shape[2] == 4 and frame.dtype == np.uint8:
+        # Compare RGBA pixels as single 32-bit words
+        changed = (np.ascontiguousarray(previous).view(np.uint32) !=
+                   np.ascontiguousarray(frame).view(np.uint32))[..., 0]
+    else:
+        changed = previous != frame
+        if changed.ndim == 3:
+            changed = changed.any(axis=2)
+    ys, xs = np.nonzero(changed)
+    cells = np.unique((ys // tile_size) * cols + xs // tile_size)
+    return [divmod(int(cell), cols) for cell in cells]
+
+def encode_png(pixels):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class TiledImage:
+    """In-memory tiled image that re-encodes only changed tiles"""
+
+    def __init__(self, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        self.frame = None
+        self.tiles = {}
+        self.tile_versions = {}
+        self.version = 0
+
+    def tile_pixels(self, row, col):
+        ts = self.tile_size
+        return self.frame[row * ts:(row + 1) * ts, col * ts:(col + 1) * ts]
+
+    def update(self, frame):
+        """Take a new frame; returns the list of re-encoded (row, col) tiles"""
+        dirty = dirty_tiles(self.frame, frame, self.tile_size)
+        if self.frame is None or self.frame.shape != frame.shape:
+            self.tiles.clear()
+            self.tile_versions.clear()
+        self.frame = frame
+        if not dirty:
+            return dirty
+        self.version += 1
+        for row, col in dirty:
+            self.tiles[(row, col)] = encode_png(self.tile_pixels(row, col))
+            self.tile_versions[(row, col)] = self.version
+        return dirty
+
+    def manifest(self):
+        height, width = self.frame.shape[:2]
+        return {
+            'width': width,
+            'height': height,
+            'tile_size': self.tile_size,
+            'version': self.version,
+            'tiles': {f"{r}_{c}": v for (r, c), v in self.tile_versions.items()},
+        }
+
+def tile_dir(image_path):
+    """Tile directory that stands in for a published image path"""
+    image_path = Path(image_path)
+    return image_path.with_name(f"{image_path.stem}.tiles")
+
+def write_tiles(directory, frame):
+    """Update the tiles of ``directory`` from a frame, writing only dirty tiles.
+
+    Tiles are written before the manifest, and both are renamed into place,
+    so a reader never sees a torn file. Returns the number of tiles written.
+    """
+    directory = Path(directory)
+    with _stores_lock:
+        image = _stores.setdefault(str(directory), TiledImage())
+        _stores.move_to_end(str(directory))
+        while len(_stores) > MAX_LOADED_BOARDS:
+            _stores.popitem(last=False)
+    dirty = image.update(frame)
+    if not dirty:
+        return 0
+    directory.mkdir(parents=True, exist_ok=True)
+    for row, col in dirty:
+        path = directory / f"{row}_{col}.png"
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(image.tiles[(row, col)])
+        os.replace(tmp_path, path)
+    storage.write_json_atomic(directory / MANIFEST_NAME, image.manifest())
+    return len(dirty)
+
+def load_manifest(directory):
+    return storage.read_json_cached(Path(directory) / MANIFEST_NAME, None)
+
+def composite(directory):
+    """Assemble the full image from a tile directory (None if nothing was published)"""
+    manifest = load_manifest(directory)
+    if manifest is None:
+        return None
+    ts = manifest['tile_size']
+    image = Image.new("RGBA", (manifest['width'], manifest['height']))
+    for name in manifest['tiles']:
+        row, col = (int(part) for part in name.split("_"))
+        try:
+            with Image.open(Path(directory) / f"{name}.png") as tile:
+                image.paste(tile, (col * ts, row * ts))
+        except FileNotFoundError:
+            continue
+    return image
+
+def composite_png(directory):
+    """PNG bytes of the full image, encoded once per manifest version"""
+    manifest = load_manifest(directory)
+    if manifest is None:
+        return None
+    key = str(directory)
+    with _composites_lock:
+        cached = _composites.get(key)
+    if cached and cached[0] == manifest['version']:
+        return cached[1]
+    image = composite(directory)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    data = buffer.getvalue()
+    with _composites_lock:
+        _composites[key] = (manifest['version'], data)
+        _composites.move_to_end(key)
+        while len(_composites) > MAX_LOADED_BOARDS:
+            _composites.popitem(last=False)
+    return data
@@ -0,0 +1,112 @@
+"""
+ماژول تاریخچه تخته سفید
+Whiteboard Timeline Module
+
+Every KEYFRAME_INTERVAL operations the full scene of a board is appended to
+``{board}.keyframes.jsonl``. An index lists, for each keyframe, its time,
+sequence number, byte offset in the keyframe file and the offset in the
+operation log right after it. The board at any moment is rebuilt from the
+latest keyframe before that moment plus the few operations logged after
+it, instead of replaying the whole lesson.
+"""
+
+import bisect
+import json
+import os
+import time
+
+from modules import storage
+from modules import whiteboard_ops
+
+# Operations between two keyframes
+KEYFRAME_INTERVAL = 200
+
+def keyframes_path(board_id):
+    return whiteboard_ops.OPS_DIR / f"{board_id}.keyframes.jsonl"
+
+def index_path(board_id):
+    return whiteboard_ops.OPS_DIR / f"{board_id}.timeline.json"
+
+def load_index(board_id):
+    """Keyframe index of a board, oldest first"""
+    return storage.read_json_cached(index_path(board_id), [])
+
+def add_keyframe(board_id, force=False, interval=KEYFRAME_INTERVAL):
+    """Store the board's current scene as a keyframe if enough has changed.
+
+    Returns True if a keyframe was written.
+    """
+    index = load_index(board_id)
+    last_seq = index[-1]['seq'] if index else 0
+    pending = whiteboard_ops.recorded_seq(board_id) - last_seq
+    if pending <= 0 or (not force and pending < interval):
+        return False
+    scene, ops_offset = whiteboard_ops.snapshot(board_id)
+
+    line = (json.dumps(scene, ensure_ascii=False, separators=(",", ":")) + "\n").encode('utf-8')
+    path = keyframes_path(board_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+        offset = os.lseek(fd, 0, os.SEEK_CUR) - len(line)
+    finally:
+        os.close(fd)
+
+    # Keyed by the time of the last operation it contains
+    entry = {'ts': scene.get('ts') or time.time(), 'seq': scene['seq'],
+             'offset': offset, 'ops_offset': ops_offset}
+    storage.write_json_atomic(index_path(board_id), index + [entry], indent=None)
+    return True
+
+def _read_keyframe(board_id, offset):
+    with open(keyframes_path(board_id), 'rb') as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+def scene_at(board_id, ts):
+    """Rebuild the board as it was at Unix time ``ts``"""
+    index = load_index(board_id)
+    position = bisect.bisect_right([entry['ts'] for entry in index], ts) - 1
+    if position >= 0:
+        entry = index[position]
+        scene = _read_keyframe(board_id, entry['offset'])
+        ops_offset = entry['ops_offset']
+    else:
+        scene = whiteboard_ops.empty_scene()
+        ops_offset = 0
+
+    path = whiteboard_ops.ops_path(board_id)
+    if not path.exists():
+        return scene
+    with open(path, 'rb') as f:
+        f.seek(ops_offset)
+        for line in f:
+            try:
+                op = json.loads(line)
+            except ValueError:
+                break  # partially written trailing line
+            if op['ts'] > ts:
+                break
+            if op['seq'] > scene['seq']:
+                whiteboard_ops.apply_op(scene, op)
+    return scene
+
+def time_range(board_id):
+    """(first, last) operation time of a board, or None if nothing was drawn"""
+    path = whiteboard_ops.ops_path(board_id)
+    version = storage.file_version(path)
+    if version is None or version[1] == 0:
+        return None
+    with open(path, 'rb') as f:
+        first = json.loads(f.readline())
+        f.seek(max(0, version[1] - 64 * 1024))
+        lines = f.read().splitlines()
+    last = first
+    for line in reversed(lines):
+        try:
+            last = json.loads(line)
+            break
+        except ValueError:
+            continue
+    return first['ts'], last['ts']
@@ -72,6 +72,7 @@ def check_dependencies():
     required_packages = [
         'streamlit',
         'streamlit_drawable_canvas',
+        'streamlit_webrtc',
         'pathlib'
     ]
     